@@ -17,7 +17,7 @@ def create_app(config_class=Config):
     login_manager.init_app(app)
 
     from app.routes import main, auth, dashboard
-    from app.routes.api import users, rooms, subjects, groups, assignments, preferences, schedule, teachers
+    from app.routes.api import users, rooms, subjects, groups, assignments, preferences, schedule, teachers, monitoring
 
     app.register_blueprint(main.bp)
     app.register_blueprint(auth.bp)
@@ -32,6 +32,15 @@ def create_app(config_class=Config):
     app.register_blueprint(preferences.bp, url_prefix='/api')
     app.register_blueprint(schedule.bp, url_prefix='/api')
     app.register_blueprint(teachers.bp, url_prefix='/api')
+    app.register_blueprint(monitoring.bp, url_prefix='/api')
+
+    from app.services.telemetry import init_request_metrics
+    init_request_metrics(app)
+
+    # Opt-in SQL query counting per request
+    from app.services.query_stats import init_query_stats
+    with app.app_context():
+        init_query_stats(app, db.engine)
 
     return app
 
@@ -21,11 +21,17 @@ class ScheduleBatch(db.Model):
     published_at = db.Column(db.DateTime, nullable=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Drafts / published lookups per semester and group, listing newest first
+        db.Index('ix_schedule_batches_semester_status_group', 'semester', 'status', 'group_id'),
+        db.Index('ix_schedule_batches_semester_created', 'semester', 'created_at'),
+    )
+    
     # Relationships
     group = db.relationship('StudentGroup', backref='schedule_batches')
     entries = db.relationship('ScheduleEntry', back_populates='batch', cascade='all, delete-orphan')
     
-    def to_dict(self, include_entries=False):
+    def to_dict(self, include_entries=False, entries_count=None):
         data = {
             'id': self.id,
             'semester': self.semester,
@@ -37,7 +43,7 @@ class ScheduleBatch(db.Model):
             'studentGaps': self.student_gaps,
             'createdAt': self.created_at.isoformat() if self.created_at else None,
             'publishedAt': self.published_at.isoformat() if self.published_at else None,
-            'entriesCount': len(self.entries) if self.entries else 0
+            'entriesCount': entries_count if entries_count is not None else (len(self.entries) if self.entries else 0)
         }
         if include_entries:
             data['entries'] = [e.to_dict() for e in self.entries]
@@ -29,6 +29,10 @@ class ScheduleEntry(db.Model):
                            name='unique_teacher_slot'),
         db.UniqueConstraint('batch_id', 'week_number', 'day_of_week', 'time_slot', 'group_id', 
                            name='unique_group_slot'),
+        # Read paths: group / teacher views filtered by semester and week range
+        db.Index('ix_schedule_entries_group_cell', 'group_id', 'semester', 'week_number', 'day_of_week', 'time_slot'),
+        db.Index('ix_schedule_entries_teacher_subject_cell', 'teacher_subject_id', 'semester', 'week_number',
+                 'day_of_week', 'time_slot'),
     )
     
     # Relationships
@@ -1,5 +1,8 @@
 from app import db
+from app.models.user import User
 from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import column_property
 import uuid
 
 
@@ -17,16 +20,17 @@ class StudentGroup(db.Model):
     teacher_subjects = db.relationship('TeacherSubject', back_populates='group', cascade='all, delete-orphan')
     schedule_entries = db.relationship('ScheduleEntry', back_populates='group', cascade='all, delete-orphan')
     
-    @property
-    def size(self):
-        """Calculate group size from students count"""
-        return len(self.students) if self.students else 0
+    # Students count loaded in the same SELECT as the group, without User rows;
+    # refreshed when the group is expired (e.g. after commit)
+    size = column_property(
+        select(func.count(User.id)).where(User.group_id == id).correlate_except(User).scalar_subquery()
+    )
     
     def to_dict(self, include_count=False):
         data = {
             'id': self.id,
             'name': self.name,
-            'size': self.size  # calculated from students
+            'size': self.size  # counted from students
         }
         if include_count:
             data['_count'] = {'students': self.size}
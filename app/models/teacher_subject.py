@@ -17,6 +17,7 @@ class TeacherSubject(db.Model):
     # Unique constraint
     __table_args__ = (
         db.UniqueConstraint('teacher_id', 'subject_id', 'group_id', name='unique_teacher_subject_group'),
+        db.Index('ix_teacher_subjects_group', 'group_id'),
     )
     
     # Relationships
@@ -17,6 +17,11 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Student counts per group (StudentGroup.size)
+        db.Index('ix_users_group', 'group_id'),
+    )
+    
     # Relationships
     group = db.relationship('StudentGroup', back_populates='students')
     teacher_subjects = db.relationship('TeacherSubject', back_populates='teacher', cascade='all, delete-orphan')
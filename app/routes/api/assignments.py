@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from app import db
 from app.models.teacher_subject import TeacherSubject
+from app.utils.pagination import get_page_limit, decode_cursor, encode_cursor, keyset_page
 
 bp = Blueprint('assignments_api', __name__)
 
@@ -19,8 +20,22 @@ def admin_required(f):
 @bp.route('/assignments', methods=['GET'])
 @login_required
 def get_assignments():
-    assignments = TeacherSubject.query.all()
-    return jsonify([a.to_dict(include_relations=True) for a in assignments])
+    limit = get_page_limit(request.args)
+    if limit is None:
+        assignments = TeacherSubject.query.all()
+        return jsonify([a.to_dict(include_relations=True) for a in assignments])
+    
+    # Keyset on id
+    cursor = request.args.get('after')
+    after = decode_cursor(cursor, (str,)) if cursor else None
+    if cursor and after is None:
+        return jsonify({'error': 'Nieprawidłowy kursor'}), 400
+    
+    assignments, last = keyset_page(TeacherSubject.query, (TeacherSubject.id,), limit, after)
+    return jsonify({
+        'items': [a.to_dict(include_relations=True) for a in assignments],
+        'nextCursor': encode_cursor((last.id,)) if last else None
+    })
 
 
 @bp.route('/assignments', methods=['POST'])
@@ -0,0 +1,35 @@
+from flask import Blueprint, current_app, jsonify
+from flask_login import login_required, current_user
+from app.services import query_stats
+
+bp = Blueprint('monitoring_api', __name__)
+
+
+def admin_required(f):
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated or current_user.role != 'ADMIN':
+            return jsonify({'error': 'Unauthorized'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@bp.route('/monitoring/queries', methods=['GET'])
+@login_required
+@admin_required
+def get_query_stats():
+    """SQL query counts and database time per endpoint since start (or last reset)"""
+    return jsonify({
+        'enabled': bool(current_app.config.get('SQL_QUERY_STATS')),
+        'slowQueryMs': current_app.config.get('SQL_SLOW_QUERY_MS'),
+        'endpoints': query_stats.endpoint_stats()
+    })
+
+
+@bp.route('/monitoring/queries', methods=['DELETE'])
+@login_required
+@admin_required
+def reset_query_stats():
+    query_stats.reset()
+    return jsonify({'success': True})
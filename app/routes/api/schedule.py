@@ -1,13 +1,23 @@
-from flask import Blueprint, jsonify, request
+from datetime import datetime
+from flask import Blueprint, current_app, jsonify, request, stream_with_context, url_for
 from flask_login import login_required, current_user
 from app import db
-from app.models.schedule_entry import ScheduleEntry
+from app.models.user import User
 from app.models.schedule_batch import ScheduleBatch
 from app.models.student_group import StudentGroup
-from app.models.teacher_subject import TeacherSubject
 from app.models.room import Room
 from app.models.preference import Preference
-from app.services.schedule_generator import generate_schedule, publish_batches, reoptimize_drafts
+from app.services.schedule_generator import generate_schedule, generate_all_schedules, publish_batches, reoptimize_drafts
+from app.services.local_search import parse_budget
+from app.services.parallel import parse_chunks
+from app.services.jobs import JOB_TYPES, submit_job, get_job, cancel_job, job_to_dict
+from app.services.schedule_cache import json_response, invalidate
+from app.services.calendar_feed import check_feed_token, feed_token, get_or_build_feed
+from app.services.schedule_reader import (
+    ORDER_COLUMNS, CURSOR_TYPES, entries_query, group_entries_query, teacher_entries_query,
+    filter_cells, ordered, row_cursor, serialize_row, serialize_compact, stream_rows
+)
+from app.utils.pagination import get_page_limit, decode_cursor, encode_cursor, keyset_page
 
 bp = Blueprint('schedule_api', __name__)
 
@@ -22,39 +32,60 @@ def admin_required(f):
     return decorated_function
 
 
+def schedule_response(key, semester, query):
+    """Serialize entries as a full list, or week-collapsed with ?format=compact
+
+    ?weekFrom, ?weekTo and ?day filter in SQL; ?limit / ?after page the full
+    list format with a keyset cursor (compact responses are never paged).
+    """
+    week_from = request.args.get('weekFrom', type=int)
+    week_to = request.args.get('weekTo', type=int)
+    day = request.args.get('day', type=int)
+    query = filter_cells(query, week_from, week_to, day)
+    params = (week_from, week_to, day)
+    
+    if request.args.get('format') == 'compact':
+        key = key + ('compact',) + params if key else None
+        return json_response(key, semester, lambda: serialize_compact(ordered(query)))
+    
+    limit = get_page_limit(request.args)
+    if limit is None:
+        key = key + ('full',) + params if key else None
+        return json_response(key, semester, lambda: [serialize_row(row) for row in ordered(query)])
+    
+    cursor = request.args.get('after')
+    after = decode_cursor(cursor, CURSOR_TYPES) if cursor else None
+    if cursor and after is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    def build_page():
+        rows, last = keyset_page(query, ORDER_COLUMNS, limit, after)
+        return {
+            'items': [serialize_row(row) for row in rows],
+            'nextCursor': row_cursor(last) if last else None
+        }
+    
+    key = key + ('page',) + params + (limit, cursor) if key else None
+    return json_response(key, semester, build_page)
+
+
 @bp.route('/schedule', methods=['GET'])
 @login_required
 def get_schedule():
     semester = request.args.get('semester', 'WINTER')
     
-    # Base query with batch join
-    query = ScheduleEntry.query.join(ScheduleBatch)
-    
-    # Non-admin users only see PUBLISHED schedules
-    if current_user.role != 'ADMIN':
-        query = query.filter(ScheduleBatch.status == 'PUBLISHED')
-    
+    # Everyone, including admin, sees only PUBLISHED schedules here
     if current_user.role == 'STUDENT' and current_user.group_id:
-        entries = query.filter(
-            ScheduleEntry.group_id == current_user.group_id,
-            ScheduleEntry.semester == semester
-        ).order_by(ScheduleEntry.week_number, ScheduleEntry.day_of_week, ScheduleEntry.time_slot).all()
+        key = ('group', current_user.group_id)
+        query = group_entries_query(current_user.group_id, semester)
     elif current_user.role == 'TEACHER':
-        teacher_subject_ids = [ts.id for ts in current_user.teacher_subjects]
-        entries = query.filter(
-            ScheduleEntry.teacher_subject_id.in_(teacher_subject_ids),
-            ScheduleEntry.semester == semester
-        ).order_by(ScheduleEntry.week_number, ScheduleEntry.day_of_week, ScheduleEntry.time_slot).all()
+        key = ('teacher', current_user.id)
+        query = teacher_entries_query(current_user.id, semester)
     else:
-        # Admin sees all
-        entries = ScheduleEntry.query.join(ScheduleBatch).filter(
-            ScheduleBatch.status == 'PUBLISHED',
-            ScheduleEntry.semester == semester
-        ).order_by(
-            ScheduleEntry.week_number, ScheduleEntry.day_of_week, ScheduleEntry.time_slot
-        ).all()
+        key = ('all',)
+        query = entries_query(semester)
     
-    return jsonify([e.to_dict() for e in entries])
+    return schedule_response(key, semester, query)
 
 
 @bp.route('/schedule/group/<id>', methods=['GET'])
@@ -62,20 +93,12 @@ def get_schedule():
 def get_schedule_for_group(id):
     semester = request.args.get('semester', 'WINTER')
     
-    query = ScheduleEntry.query.join(ScheduleBatch).filter(
-        ScheduleEntry.group_id == id,
-        ScheduleEntry.semester == semester
-    )
-    
-    # Non-admin only sees published
-    if current_user.role != 'ADMIN':
-        query = query.filter(ScheduleBatch.status == 'PUBLISHED')
-    
-    entries = query.order_by(
-        ScheduleEntry.week_number, ScheduleEntry.day_of_week, ScheduleEntry.time_slot
-    ).all()
+    # Non-admin only sees published; drafts are never cached
+    published_only = current_user.role != 'ADMIN'
+    query = group_entries_query(id, semester, published_only=published_only)
     
-    return jsonify([e.to_dict() for e in entries])
+    key = ('group', id) if published_only else None
+    return schedule_response(key, semester, query)
 
 
 @bp.route('/schedule/teacher/<id>', methods=['GET'])
@@ -83,23 +106,121 @@ def get_schedule_for_group(id):
 def get_schedule_for_teacher(id):
     semester = request.args.get('semester', 'WINTER')
     
-    teacher_subjects = TeacherSubject.query.filter_by(teacher_id=id).all()
-    teacher_subject_ids = [ts.id for ts in teacher_subjects]
+    # Non-admin only sees published; drafts are never cached
+    published_only = current_user.role != 'ADMIN'
+    query = teacher_entries_query(id, semester, published_only=published_only)
     
-    query = ScheduleEntry.query.join(ScheduleBatch).filter(
-        ScheduleEntry.teacher_subject_id.in_(teacher_subject_ids),
-        ScheduleEntry.semester == semester
+    key = ('teacher', id) if published_only else None
+    return schedule_response(key, semester, query)
+
+
+# ===== EXPORT (Admin only) =====
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+@bp.route('/schedule/export', methods=['GET'])
+@login_required
+@admin_required
+def export_schedule():
+    """Stream all published entries of a semester as NDJSON (default) or a JSON array
+
+    Rows are read with yield_per and written in chunks, so memory stays flat
+    regardless of semester size. Accepts the weekFrom / weekTo / day filters.
+    """
+    semester = request.args.get('semester', 'WINTER')
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'json'):
+        return jsonify({'error': 'Format must be ndjson or json'}), 400
+    
+    query = filter_cells(
+        entries_query(semester),
+        request.args.get('weekFrom', type=int),
+        request.args.get('weekTo', type=int),
+        request.args.get('day', type=int)
     )
-    
-    # Non-admin only sees published
-    if current_user.role != 'ADMIN':
-        query = query.filter(ScheduleBatch.status == 'PUBLISHED')
-    
-    entries = query.order_by(
-        ScheduleEntry.week_number, ScheduleEntry.day_of_week, ScheduleEntry.time_slot
-    ).all()
-    
-    return jsonify([e.to_dict() for e in entries])
+    dumps = current_app.json.dumps
+    
+    def encode(lines, first):
+        if fmt == 'ndjson':
+            return '\n'.join(lines) + '\n'
+        return ('' if first else ',') + ','.join(lines)
+    
+    def generate():
+        if fmt == 'json':
+            yield '['
+        lines = []
+        first = True
+        for row in stream_rows(query, EXPORT_CHUNK_SIZE):
+            lines.append(dumps(serialize_row(row)))
+            if len(lines) >= EXPORT_CHUNK_SIZE:
+                yield encode(lines, first)
+                lines, first = [], False
+        if lines:
+            yield encode(lines, first)
+        if fmt == 'json':
+            yield ']'
+    
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return current_app.response_class(stream_with_context(generate()), mimetype=mimetype)
+
+
+# ===== CALENDAR FEEDS =====
+
+def calendar_feed_response(kind, entity_id, name_loader):
+    """ICS feed; a signed ?token= works without a session so calendar apps can subscribe"""
+    token = request.args.get('token')
+    if not (token and check_feed_token(token, kind, entity_id)) and not current_user.is_authenticated:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    feed = get_or_build_feed(kind, entity_id, name_loader)
+    if feed is None:
+        return jsonify({'error': 'Not found'}), 404
+    
+    body, etag = feed
+    response = current_app.response_class(body, mimetype='text/calendar')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'private, max-age={current_app.config.get("CALENDAR_FEED_TTL", 300)}'
+    return response.make_conditional(request)
+
+
+@bp.route('/schedule/group/<id>/calendar.ics', methods=['GET'])
+def group_calendar_feed(id):
+    def load_name():
+        group = StudentGroup.query.get(id)
+        return group.name if group else None
+    return calendar_feed_response('group', id, load_name)
+
+
+@bp.route('/schedule/teacher/<id>/calendar.ics', methods=['GET'])
+def teacher_calendar_feed(id):
+    def load_name():
+        teacher = User.query.filter_by(id=id, role='TEACHER').first()
+        return teacher.name if teacher else None
+    return calendar_feed_response('teacher', id, load_name)
+
+
+@bp.route('/schedule/calendar-feeds', methods=['GET'])
+@login_required
+def get_calendar_feeds():
+    """Subscription URLs: own group / own teacher feed, every feed for admin"""
+    if current_user.role == 'ADMIN':
+        entities = [('group', g.id, g.name) for g in StudentGroup.query.order_by(StudentGroup.name).all()]
+        entities += [('teacher', t.id, t.name) for t in User.query.filter_by(role='TEACHER').order_by(User.name).all()]
+    elif current_user.role == 'TEACHER':
+        entities = [('teacher', current_user.id, current_user.name)]
+    elif current_user.group_id:
+        entities = [('group', current_user.group_id, current_user.group.name)]
+    else:
+        entities = []
+    
+    return jsonify([{
+        'type': kind,
+        'id': entity_id,
+        'name': name,
+        'url': url_for(f'schedule_api.{kind}_calendar_feed', id=entity_id,
+                       token=feed_token(kind, entity_id), _external=True)
+    } for kind, entity_id, name in entities])
 
 
 # ===== DRAFT MANAGEMENT ENDPOINTS (Admin only) =====
@@ -126,11 +247,24 @@ def get_all_batches():
     """Get all schedule batches (draft + published)"""
     semester = request.args.get('semester', 'WINTER')
     
-    batches = ScheduleBatch.query.filter_by(
-        semester=semester
-    ).order_by(ScheduleBatch.created_at.desc()).all()
+    query = ScheduleBatch.query.filter_by(semester=semester)
     
-    return jsonify([b.to_dict() for b in batches])
+    limit = get_page_limit(request.args)
+    if limit is None:
+        batches = query.order_by(ScheduleBatch.created_at.desc()).all()
+        return jsonify([b.to_dict() for b in batches])
+    
+    # Newest first, keyset on (created_at, id)
+    cursor = request.args.get('after')
+    after = decode_cursor(cursor, (datetime.fromisoformat, str)) if cursor else None
+    if cursor and after is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    batches, last = keyset_page(query, (ScheduleBatch.created_at, ScheduleBatch.id), limit, after, descending=True)
+    return jsonify({
+        'items': [b.to_dict() for b in batches],
+        'nextCursor': encode_cursor((last.created_at.isoformat(), last.id)) if last else None
+    })
 
 
 @bp.route('/schedule/generate', methods=['POST'])
@@ -146,8 +280,35 @@ def generate_schedule_endpoint():
     group_id = data.get('groupId')
     semester = data.get('semester', 'WINTER')
     resolved_conflicts = data.get('resolvedConflicts', {})
+    local_search = parse_budget(data.get('localSearch'))
+    template = bool(data.get('template', False))
+    profile = bool(data.get('profile', False))
     
-    result = generate_schedule(group_id, semester, resolved_conflicts)
+    result = generate_schedule(group_id, semester, resolved_conflicts, local_search=local_search, template=template,
+                               profile=profile)
+    
+    if 'error' in result:
+        return jsonify(result), 400
+    
+    return jsonify(result)
+
+
+@bp.route('/schedule/generate-all', methods=['POST'])
+@login_required
+@admin_required
+def generate_all_schedules_endpoint():
+    """Generate DRAFT schedules for all (or selected) groups in one pass"""
+    data = request.get_json(silent=True) or {}
+    
+    semester = data.get('semester', 'WINTER')
+    group_ids = data.get('groupIds')
+    weights = data.get('weights')
+    local_search = parse_budget(data.get('localSearch'))
+    template = bool(data.get('template', False))
+    profile = bool(data.get('profile', False))
+    
+    result = generate_all_schedules(semester, group_ids, weights, local_search=local_search, template=template,
+                                    profile=profile)
     
     if 'error' in result:
         return jsonify(result), 400
@@ -187,8 +348,14 @@ def reoptimize_schedules():
     batch_ids = data.get('batchIds')
     semester = data.get('semester', 'WINTER')
     weights = data.get('weights')
+    parallel = bool(data.get('parallel', False))
+    local_search = parse_budget(data.get('localSearch'))
+    template = bool(data.get('template', False))
+    profile = bool(data.get('profile', False))
+    chunks = parse_chunks(data.get('chunks'))
     
-    result = reoptimize_drafts(batch_ids, semester, weights)
+    result = reoptimize_drafts(batch_ids, semester, weights, parallel=parallel, local_search=local_search,
+                               template=template, profile=profile, chunks=chunks)
     
     if 'error' in result:
         return jsonify(result), 400
@@ -196,6 +363,66 @@ def reoptimize_schedules():
     return jsonify(result)
 
 
+# ===== BACKGROUND JOBS (Admin only) =====
+
+@bp.route('/schedule/jobs', methods=['POST'])
+@login_required
+@admin_required
+def submit_schedule_job():
+    """Run generate / generate_all / reoptimize in the background"""
+    data = request.get_json()
+    
+    if not data or data.get('type') not in JOB_TYPES:
+        return jsonify({'error': f'Job type must be one of: {", ".join(JOB_TYPES)}'}), 400
+    
+    job_type = data.get('type')
+    if job_type == 'generate' and not data.get('groupId'):
+        return jsonify({'error': 'Group ID is required'}), 400
+    if job_type == 'reoptimize' and not data.get('batchIds'):
+        return jsonify({'error': 'Batch IDs are required'}), 400
+    
+    job = submit_job(current_app._get_current_object(), job_type, data)
+    return jsonify(job), 202
+
+
+@bp.route('/schedule/jobs/<id>', methods=['GET'])
+@login_required
+@admin_required
+def get_schedule_job(id):
+    """Get job status and progress (percent of assignments placed)"""
+    job = get_job(id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+
+@bp.route('/schedule/jobs/<id>/cancel', methods=['POST'])
+@login_required
+@admin_required
+def cancel_schedule_job(id):
+    """Cancel a pending or running job"""
+    job = cancel_job(id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@bp.route('/schedule/jobs/<id>/result', methods=['GET'])
+@login_required
+@admin_required
+def get_schedule_job_result(id):
+    """Get result of a finished job"""
+    job = get_job(id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    status = job_to_dict(job)
+    if status['status'] != 'DONE':
+        return jsonify(status), 409
+    
+    return jsonify(job['result'])
+
+
 @bp.route('/schedule/batch/<id>', methods=['DELETE'])
 @login_required
 @admin_required
@@ -211,5 +438,6 @@ def delete_batch(id):
     
     db.session.delete(batch)
     db.session.commit()
+    invalidate()
     
     return jsonify({'success': True})
@@ -1,5 +1,8 @@
-from flask import Blueprint, render_template, redirect, url_for
+import hmac
+
+from flask import Blueprint, Response, current_app, render_template, redirect, request, url_for
 from flask_login import current_user
+from app.services import telemetry
 
 bp = Blueprint('main', __name__)
 
@@ -9,3 +12,13 @@ def index():
     if current_user.is_authenticated:
         return redirect(url_for('dashboard.index'))
     return render_template('index.html')
+
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint; with METRICS_TOKEN set it needs 'Authorization: Bearer <token>'"""
+    token = current_app.config.get('METRICS_TOKEN')
+    given = request.headers.get('Authorization', '').encode()
+    if token and not hmac.compare_digest(given, ('Bearer ' + token).encode()):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(telemetry.render(), content_type=telemetry.CONTENT_TYPE)
@@ -0,0 +1,199 @@
+"""
+iCalendar (ICS) feeds of published schedules per group and teacher
+Blocks repeating at a fixed weekly interval collapse into one VEVENT with RRULE / EXDATE
+"""
+
+from datetime import date, datetime, timedelta
+import hashlib
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from app.models.schedule_batch import ScheduleBatch
+from app.services.schedule_cache import data_version, get_feed, put_feed
+from app.services.schedule_reader import group_entries_query, ordered, teacher_entries_query
+from app.utils.time_slots import get_slot_by_number
+
+SEMESTERS = ('WINTER', 'SUMMER')
+
+# DTSTAMP of batches published before published_at was recorded
+EPOCH = datetime(1970, 1, 1)
+
+CALENDAR_TIMEZONE = 'Europe/Warsaw'
+VTIMEZONE = [
+    'BEGIN:VTIMEZONE',
+    'TZID:Europe/Warsaw',
+    'BEGIN:DAYLIGHT',
+    'TZOFFSETFROM:+0100',
+    'TZOFFSETTO:+0200',
+    'TZNAME:CEST',
+    'DTSTART:19700329T020000',
+    'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU',
+    'END:DAYLIGHT',
+    'BEGIN:STANDARD',
+    'TZOFFSETFROM:+0200',
+    'TZOFFSETTO:+0100',
+    'TZNAME:CET',
+    'DTSTART:19701025T030000',
+    'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU',
+    'END:STANDARD',
+    'END:VTIMEZONE',
+]
+
+
+def semester_start(semester, today=None):
+    """Monday of week 1; SEMESTER_START_<SEMESTER> config (YYYY-MM-DD) or the current academic year"""
+    configured = current_app.config.get(f'SEMESTER_START_{semester}')
+    if configured:
+        start = date.fromisoformat(configured)
+    else:
+        today = today or date.today()
+        year = today.year if today.month >= 8 else today.year - 1  # academic year starts in October
+        start = date(year, 10, 1) if semester == 'WINTER' else date(year + 1, 2, 24)
+    return start - timedelta(days=start.weekday())
+
+
+def feed_token(kind, entity_id):
+    """Signed token that lets calendar clients fetch a feed without a session"""
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='calendar-feed').dumps([kind, entity_id])
+
+
+def check_feed_token(token, kind, entity_id):
+    try:
+        return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='calendar-feed').loads(token) == \
+            [kind, entity_id]
+    except BadSignature:
+        return False
+
+
+def escape_text(value):
+    return str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold(line):
+    """Split content lines longer than 75 octets (RFC 5545, 3.1)"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        while (data[cut] & 0xC0) == 0x80:  # do not split a UTF-8 sequence
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    parts.append(data.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def local_time(day_date, hhmm):
+    return day_date.strftime('%Y%m%d') + 'T' + hhmm.replace(':', '') + '00'
+
+
+def collect_series(rows):
+    """Group entries that differ only by week: key -> sorted week numbers"""
+    series = {}
+    for row in rows:
+        key = (row.semester, row.batch_id, row.day_of_week, row.time_slot, row.room_name,
+               row.subject_name, row.subject_type, row.teacher_name, row.group_name)
+        series.setdefault(key, []).append(row.week_number)
+    return series
+
+
+def recurrence_lines(weeks, start_date, slot_start):
+    """RRULE (and EXDATE for skipped weeks) for occurrences on the given weeks"""
+    if len(weeks) == 1:
+        return []
+    step = weeks[1] - weeks[0]
+    if all(b - a == step for a, b in zip(weeks, weeks[1:])):
+        interval = f';INTERVAL={step}' if step > 1 else ''
+        return [f'RRULE:FREQ=WEEKLY{interval};COUNT={len(weeks)}']
+
+    # Irregular weeks: every week from first to last, minus the missing ones
+    present = set(weeks)
+    missing = [w for w in range(weeks[0], weeks[-1] + 1) if w not in present]
+    exdates = ','.join(local_time(start_date + timedelta(weeks=w - weeks[0]), slot_start) for w in missing)
+    return [
+        f'RRULE:FREQ=WEEKLY;COUNT={weeks[-1] - weeks[0] + 1}',
+        f'EXDATE;TZID={CALENDAR_TIMEZONE}:{exdates}',
+    ]
+
+
+def render_calendar(name, rows_by_semester):
+    """Full VCALENDAR text for the given published rows
+
+    DTSTAMP is the batch's publish time, so an unchanged schedule renders the same body (and ETag).
+    """
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//SOHZ//Plan zajec//PL',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+        f'X-WR-TIMEZONE:{CALENDAR_TIMEZONE}',
+    ] + VTIMEZONE
+
+    for semester, rows in rows_by_semester:
+        monday = semester_start(semester)
+        stamps = {row.batch_id: row.published_at for row in rows}
+        for key, weeks in collect_series(rows).items():
+            _, batch_id, day, slot, room, subject, subject_type, teacher, group = key
+            weeks = sorted(weeks)
+            slot_info = get_slot_by_number(slot)
+            first_date = monday + timedelta(weeks=weeks[0] - 1, days=day)
+            uid = hashlib.sha1('|'.join(map(str, key)).encode('utf-8')).hexdigest()
+            stamp = (stamps[batch_id] or EPOCH).strftime('%Y%m%dT%H%M%SZ')
+
+            lines += [
+                'BEGIN:VEVENT',
+                f'UID:{uid}@sohz',
+                f'DTSTAMP:{stamp}',
+                f'DTSTART;TZID={CALENDAR_TIMEZONE}:{local_time(first_date, slot_info["startTime"])}',
+                f'DTEND;TZID={CALENDAR_TIMEZONE}:{local_time(first_date, slot_info["endTime"])}',
+            ]
+            lines += recurrence_lines(weeks, first_date, slot_info['startTime'])
+            lines += [
+                f'SUMMARY:{escape_text(f"{subject} ({subject_type})")}',
+                f'LOCATION:{escape_text(room)}',
+                f'DESCRIPTION:{escape_text(f"Prowadzący: {teacher}, grupa: {group}")}',
+                'END:VEVENT',
+            ]
+
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(fold(line) for line in lines) + '\r\n'
+
+
+def build_feed(kind, entity_id, name):
+    """Render the feed of one group or teacher from published batches of all semesters"""
+    query_for = group_entries_query if kind == 'group' else teacher_entries_query
+    rows_by_semester = [
+        (semester, ordered(query_for(entity_id, semester).add_columns(
+            ScheduleBatch.published_at.label('published_at')
+        )).all())
+        for semester in SEMESTERS
+    ]
+    return render_calendar(name, rows_by_semester).encode('utf-8')
+
+
+def get_or_build_feed(kind, entity_id, name_loader):
+    """(body, etag) from the feed cache, None for an unknown entity
+
+    A hit costs one data_version() query; the feed is only rendered again after a publish or an edit.
+    """
+    version = data_version()
+    cached = get_feed((kind, entity_id), version)
+    if cached is not None:
+        return cached
+    name = name_loader()
+    if name is None:
+        return None
+    return put_feed((kind, entity_id), version, build_feed(kind, entity_id, name))
+
+
+def warm_feeds(groups, teachers):
+    """Pre-render feeds of freshly published groups and their teachers"""
+    version = data_version()
+    for kind, entities in (('group', groups), ('teacher', teachers)):
+        for entity in entities:
+            put_feed((kind, entity.id), version, build_feed(kind, entity.id, entity.name))
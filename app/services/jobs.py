@@ -0,0 +1,239 @@
+"""
+Background jobs for schedule generation and reoptimization
+Jobs run in a local process pool; their state lives in an in-process registry
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+import threading
+import uuid
+
+from app.services import telemetry
+
+JOB_TYPES = ('generate', 'generate_all', 'reoptimize')
+
+# Finished jobs kept in the registry before the oldest are dropped
+MAX_FINISHED_JOBS = 100
+
+_lock = threading.RLock()
+_jobs = {}
+_executor = None
+_manager = None
+
+# Flask app of a pool worker process, created on first job
+_worker_app = None
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when its job was cancelled"""
+
+
+def _get_executor(max_workers):
+    global _executor, _manager
+    with _lock:
+        if _executor is None:
+            context = multiprocessing.get_context('spawn')
+            _manager = context.Manager()
+            _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        return _executor
+
+
+def get_worker_app(database_uri):
+    """Flask app bound to the given database, one per worker process"""
+    global _worker_app
+    if _worker_app is None:
+        from app import create_app
+        from config import Config
+
+        class WorkerConfig(Config):
+            SQLALCHEMY_DATABASE_URI = database_uri
+
+        _worker_app = create_app(WorkerConfig)
+    return _worker_app
+
+
+def _run_job(database_uri, job_type, params, state, cancel_event):
+    """Job entry point executed in a pool worker process"""
+    from app import db
+    from app.services.local_search import parse_budget
+    from app.services.parallel import parse_chunks
+    from app.services.schedule_generator import generate_schedule, generate_all_schedules, reoptimize_drafts
+
+    if cancel_event.is_set():
+        return {'cancelled': True}
+    state['startedAt'] = datetime.utcnow().isoformat()
+
+    def progress(done, total):
+        if cancel_event.is_set():
+            raise JobCancelled()
+        state['done'] = done
+        state['total'] = total
+
+    local_search = parse_budget(params.get('localSearch'))
+    template = bool(params.get('template', False))
+    profile = bool(params.get('profile', False))
+
+    app = get_worker_app(database_uri)
+    with app.app_context():
+        try:
+            if job_type == 'generate':
+                result = generate_schedule(
+                    params.get('groupId'),
+                    params.get('semester', 'WINTER'),
+                    params.get('resolvedConflicts', {}),
+                    weights=params.get('weights'),
+                    progress=progress,
+                    local_search=local_search,
+                    template=template,
+                    profile=profile
+                )
+            elif job_type == 'generate_all':
+                result = generate_all_schedules(
+                    params.get('semester', 'WINTER'),
+                    params.get('groupIds'),
+                    params.get('weights'),
+                    progress=progress,
+                    local_search=local_search,
+                    template=template,
+                    profile=profile
+                )
+            else:
+                result = reoptimize_drafts(
+                    params.get('batchIds'),
+                    params.get('semester', 'WINTER'),
+                    params.get('weights'),
+                    progress=progress,
+                    parallel=bool(params.get('parallel', False)),
+                    local_search=local_search,
+                    template=template,
+                    profile=profile,
+                    chunks=parse_chunks(params.get('chunks'))
+                )
+            # Solver metrics of this worker go back to the web process
+            result['solverMetrics'] = telemetry.drain()
+            return result
+        except JobCancelled:
+            db.session.rollback()
+            return {'cancelled': True}
+        finally:
+            db.session.remove()
+
+
+def _prune_finished():
+    finished = [j for j in _jobs.values() if j['finishedAt']]
+    finished.sort(key=lambda j: j['finishedAt'])
+    for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job['id']]
+
+
+def _read_state(job):
+    state = job['state']
+    if state is None:
+        return job['snapshot']
+    try:
+        return dict(state)
+    except (EOFError, OSError):
+        return job['snapshot']
+
+
+def _on_job_done(job_id, future):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        # Keep the last progress and release the shared proxies
+        job['snapshot'] = _read_state(job)
+        job['state'] = None
+        job['cancel_event'] = None
+        job['finishedAt'] = datetime.utcnow().isoformat()
+        if future.cancelled():
+            job['status'] = 'CANCELLED'
+        elif future.exception() is not None:
+            job['status'] = 'FAILED'
+            job['error'] = str(future.exception())
+        else:
+            result = future.result()
+            telemetry.merge(result.pop('solverMetrics', {}))
+            if result.get('cancelled'):
+                job['status'] = 'CANCELLED'
+            elif 'error' in result:
+                job['status'] = 'FAILED'
+                job['error'] = result['error']
+            else:
+                job['status'] = 'DONE'
+                job['result'] = result
+        _prune_finished()
+
+
+def submit_job(app, job_type, params):
+    """Queue a solver run and return its job descriptor"""
+    executor = _get_executor(app.config.get('SCHEDULE_JOB_WORKERS', 2))
+    job_id = str(uuid.uuid4())[:25]
+    state = _manager.dict({'done': 0, 'total': 0, 'startedAt': None})
+    cancel_event = _manager.Event()
+
+    job = {
+        'id': job_id,
+        'type': job_type,
+        'status': 'PENDING',
+        'createdAt': datetime.utcnow().isoformat(),
+        'finishedAt': None,
+        'error': None,
+        'result': None,
+        'state': state,
+        'snapshot': {'done': 0, 'total': 0, 'startedAt': None},
+        'cancel_event': cancel_event,
+        'future': None
+    }
+    with _lock:
+        _jobs[job_id] = job
+        job['future'] = executor.submit(
+            _run_job, app.config['SQLALCHEMY_DATABASE_URI'], job_type, params, state, cancel_event
+        )
+        job['future'].add_done_callback(lambda f: _on_job_done(job_id, f))
+    return job_to_dict(job)
+
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def cancel_job(job_id):
+    """Request cancellation; a running job stops after the current assignment"""
+    job = get_job(job_id)
+    if job is None:
+        return None
+    with _lock:
+        if not job['finishedAt']:
+            job['cancel_event'].set()
+            job['future'].cancel()
+    return job_to_dict(job)
+
+
+def job_to_dict(job):
+    status = job['status']
+    state = _read_state(job)
+    done, total = state.get('done', 0), state.get('total', 0)
+    started_at = state.get('startedAt')
+    if started_at and status == 'PENDING':
+        status = 'RUNNING'
+
+    if job['finishedAt'] and status == 'DONE':
+        percent = 100.0
+    else:
+        percent = round(done / total * 100, 1) if total else 0.0
+
+    return {
+        'id': job['id'],
+        'type': job['type'],
+        'status': status,
+        'progress': percent,
+        'assignmentsDone': done,
+        'assignmentsTotal': total,
+        'createdAt': job['createdAt'],
+        'startedAt': started_at,
+        'finishedAt': job['finishedAt'],
+        'error': job['error']
+    }
@@ -0,0 +1,318 @@
+"""
+Local search improvement phase run after greedy placement
+Simulated annealing over move / swap neighbourhoods with incremental delta scoring
+"""
+
+import math
+import random
+import time
+
+from app.services.metrics import calculate_gaps, calculate_preference_score
+from app.services.occupancy import (
+    DAYS_PER_WEEK, SLOTS_PER_DAY, MAX_DAILY_SLOTS_PER_SUBJECT, MAX_DAILY_SLOTS_FOR_GROUP
+)
+
+# Cost units, the terms of the greedy score_slot summed over a schedule (lower cost = better)
+PREFERENCE_UNIT = 20  # per preference priority point, times preferences weight
+GAP_UNIT = 30  # per empty slot between classes, times gaps weight
+ADJACENT_UNIT = 40  # bonus per pair of back-to-back classes, times gaps weight
+LOAD_UNIT = 50  # per pair of classes of a group on the same day (greedy day load penalty)
+LATE_SLOT_UNIT = 10  # per slot after 8:00, same as the greedy morning bonus
+
+# Annealing temperature range
+START_TEMPERATURE = 30.0
+END_TEMPERATURE = 0.1
+
+# Hard caps for budgets coming from requests
+MAX_ITERATIONS = 1000000
+MAX_SECONDS = 600
+
+
+def count_gaps(day_bits):
+    """Empty slots between the first and last class of a day"""
+    if not day_bits:
+        return 0
+    first = (day_bits & -day_bits).bit_length()
+    return day_bits.bit_length() - first + 1 - bin(day_bits).count('1')
+
+
+def count_adjacent(day_bits):
+    """Pairs of back-to-back classes in a day"""
+    return bin(day_bits & (day_bits >> 1)).count('1')
+
+
+def parse_budget(data):
+    """Read {'iterations': n, 'seconds': t, 'seed': s} from request data, None if disabled
+
+    The budget is for the whole request; many groups are searched together in one run.
+    """
+    if not isinstance(data, dict):
+        return None
+    try:
+        iterations = min(int(data.get('iterations') or 0), MAX_ITERATIONS)
+        seconds = min(float(data.get('seconds') or 0), MAX_SECONDS)
+        seed = int(data.get('seed') or 0)
+    except (TypeError, ValueError):
+        return None
+    if iterations <= 0 and seconds <= 0:
+        return None
+    return {'iterations': iterations or None, 'seconds': seconds or None, 'seed': seed}
+
+
+def split_budget(budget, parts):
+    """Equal share of a request budget for one of parts runs, None when nothing is left"""
+    if not budget or parts <= 1:
+        return budget
+    iterations = budget['iterations'] // parts if budget['iterations'] else None
+    seconds = budget['seconds'] / parts if budget['seconds'] else None
+    if not iterations and not seconds:
+        return None
+    return {'iterations': iterations or None, 'seconds': seconds, 'seed': budget['seed']}
+
+
+class _Placed:
+    """Mutable view of one placed entry used during the search, ids interned in state"""
+    __slots__ = ('entry', 'assignment', 'teacher', 'group', 'room', 'preferences', 'eligible_rooms')
+
+    def __init__(self, state, entry, teacher_id, preferences, eligible_rooms):
+        self.entry = entry
+        self.assignment = state.assignment(entry.teacher_subject_id)
+        self.teacher = state.teacher(teacher_id)
+        self.group = state.group(entry.group_id)
+        self.room = state.rooms.position(entry.room_id)
+        self.preferences = preferences
+        self.eligible_rooms = eligible_rooms
+
+
+def improve_schedule(state, entries, teacher_lookup, eligible_rooms, preference_matrix, weights,
+                     iterations=None, seconds=None, seed=0):
+    """Improve placed entries in place; moves stay within the entry's week
+
+    entries must already be marked in state and may belong to several groups.
+    eligible_rooms maps assignment id to the room mask it may use. A schedule only
+    stays acceptable if no group gets more gaps or a lower preference score.
+    Returns search statistics.
+    """
+    w_pref = weights.get('preferences', 2)
+    w_t = weights.get('teacher_gaps', 2)
+    w_s = weights.get('student_gaps', 2)
+
+    placed = [_Placed(state, e, teacher_lookup[e.teacher_subject_id],
+                      preference_matrix.get(teacher_lookup[e.teacher_subject_id]),
+                      eligible_rooms[e.teacher_subject_id])
+              for e in entries]
+    by_week = {}
+    for p in placed:
+        by_week.setdefault(p.entry.week_number, []).append(p)
+
+    stats = {'iterations': 0, 'accepted': 0, 'costBefore': 0.0, 'costAfter': 0.0}
+    if not placed or (not iterations and not seconds):
+        return stats
+
+    def slot_cost(p, day, slot):
+        row = p.preferences
+        priority = row[day * SLOTS_PER_DAY + slot - 1] if row else None
+        return -w_pref * PREFERENCE_UNIT * (priority or 0) + LATE_SLOT_UNIT * (slot - 1)
+
+    def days_cost(days):
+        cost = 0
+        for kind, entity, week, day in days:
+            if kind == 't':
+                bits = state.teachers.day_bits(entity, week, day)
+                cost += w_t * (GAP_UNIT * count_gaps(bits) - ADJACENT_UNIT * count_adjacent(bits))
+            else:
+                bits = state.groups.day_bits(entity, week, day)
+                load = bin(bits).count('1')
+                cost += w_s * (GAP_UNIT * count_gaps(bits) - ADJACENT_UNIT * count_adjacent(bits))
+                cost += LOAD_UNIT * load * (load - 1) // 2
+        return cost
+
+    def affected_days(items, days):
+        keys = set()
+        for p in items:
+            for day in days:
+                keys.add(('t', p.teacher, p.entry.week_number, day))
+                keys.add(('g', p.group, p.entry.week_number, day))
+        return keys
+
+    def unmark(p):
+        e = p.entry
+        state.unmark_slot_occupied(p.teacher, p.group, p.room, e.week_number, e.day_of_week, e.time_slot,
+                                   p.assignment)
+
+    def mark(p):
+        e = p.entry
+        state.mark_slot_occupied(p.teacher, p.group, p.room, e.week_number, e.day_of_week, e.time_slot,
+                                 p.assignment)
+
+    def set_cell(p, day, slot, room):
+        p.entry.day_of_week, p.entry.time_slot, p.room = day, slot, room
+        changed_groups.add(p.entry.group_id)
+
+    def pick_room(p, day, slot):
+        """Keep the current room if free, otherwise take the first free eligible one"""
+        week = p.entry.week_number
+        if p.room is not None and not state.rooms.is_busy(p.room, week, day, slot) and \
+                state.rooms.eligible_contains(p.eligible_rooms, p.room):
+            return p.room
+        return state.rooms.find_free(p.eligible_rooms, week, day, slot)
+
+    def try_move(p, day, slot):
+        """Returns (delta, undo) or None if the move is infeasible"""
+        e = p.entry
+        week, old = e.week_number, (e.day_of_week, e.time_slot, p.room)
+        if (day, slot) == old[:2]:
+            return None
+        days = affected_days([p], {old[0], day})
+        before = days_cost(days) + slot_cost(p, old[0], old[1])
+
+        unmark(p)
+        room = None
+        if not state.is_slot_occupied(p.teacher, p.group, week, day, slot) and \
+                (day == old[0] or (state.day_load(p.assignment, week, day) < MAX_DAILY_SLOTS_PER_SUBJECT and
+                                   state.group_load(p.group, week, day) < MAX_DAILY_SLOTS_FOR_GROUP)):
+            room = pick_room(p, day, slot)
+        if room is None:
+            mark(p)
+            return None
+
+        set_cell(p, day, slot, room)
+        mark(p)
+        after = days_cost(days) + slot_cost(p, day, slot)
+
+        def undo():
+            unmark(p)
+            set_cell(p, *old)
+            mark(p)
+        return after - before, undo
+
+    def try_swap(p, q):
+        """Exchange the cells of two entries of the same week"""
+        if p.assignment == q.assignment:
+            return None
+        e, f = p.entry, q.entry
+        old_p, old_q = (e.day_of_week, e.time_slot, p.room), (f.day_of_week, f.time_slot, q.room)
+        week = e.week_number
+        days = affected_days([p, q], {old_p[0], old_q[0]})
+        before = days_cost(days) + slot_cost(p, *old_p[:2]) + slot_cost(q, *old_q[:2])
+
+        unmark(p)
+        unmark(q)
+        ok = (not state.is_slot_occupied(p.teacher, p.group, week, *old_q[:2]) and
+              not state.is_slot_occupied(q.teacher, q.group, week, *old_p[:2]) and
+              (old_p[0] == old_q[0] or
+               (state.day_load(p.assignment, week, old_q[0]) < MAX_DAILY_SLOTS_PER_SUBJECT and
+                state.day_load(q.assignment, week, old_p[0]) < MAX_DAILY_SLOTS_PER_SUBJECT and
+                (p.group == q.group or
+                 (state.group_load(p.group, week, old_q[0]) < MAX_DAILY_SLOTS_FOR_GROUP and
+                  state.group_load(q.group, week, old_p[0]) < MAX_DAILY_SLOTS_FOR_GROUP)))))
+        room_p = room_q = None
+        if ok:
+            room_p = pick_room(p, *old_q[:2])
+            if room_p is not None:
+                # Reserve p's new room before choosing q's
+                set_cell(p, old_q[0], old_q[1], room_p)
+                mark(p)
+                room_q = pick_room(q, *old_p[:2])
+                unmark(p)
+                set_cell(p, *old_p)
+        if room_p is None or room_q is None:
+            mark(p)
+            mark(q)
+            return None
+
+        set_cell(p, old_q[0], old_q[1], room_p)
+        set_cell(q, old_p[0], old_p[1], room_q)
+        mark(p)
+        mark(q)
+        after = days_cost(days) + slot_cost(p, *old_q[:2]) + slot_cost(q, *old_p[:2])
+
+        def undo():
+            unmark(p)
+            unmark(q)
+            set_cell(p, *old_p)
+            set_cell(q, *old_q)
+            mark(p)
+            mark(q)
+        return after - before, undo
+
+    def total_cost():
+        """Full cost over every day of the involved teachers and groups"""
+        days = affected_days(placed, range(DAYS_PER_WEEK))
+        cost = sum(slot_cost(p, p.entry.day_of_week, p.entry.time_slot) for p in placed)
+        return cost + days_cost(days)
+
+    def snapshot():
+        return [(p.entry.day_of_week, p.entry.time_slot, p.room) for p in placed]
+
+    def group_quality(group_entries):
+        """Reported metrics of one group: teacher gaps, student gaps, preference score"""
+        return (calculate_gaps(group_entries, 'teacher', teacher_lookup), calculate_gaps(group_entries, 'student'),
+                calculate_preference_score(group_entries, preference_matrix, teacher_lookup))
+
+    def no_worse():
+        """Groups changed by the last move keep the metrics they had at the start"""
+        for g_id in changed_groups:
+            q, s = group_quality(entries_by_group[g_id]), start_quality[g_id]
+            if q[0] > s[0] or q[1] > s[1] or q[2] < s[2]:
+                return False
+        return True
+
+    entries_by_group = {}
+    for e in entries:
+        entries_by_group.setdefault(e.group_id, []).append(e)
+    start_quality = {g_id: group_quality(group_entries) for g_id, group_entries in entries_by_group.items()}
+    changed_groups = set()
+
+    rng = random.Random(seed)
+    start = time.monotonic()
+    cost = best_cost = stats['costBefore'] = total_cost()
+    best = snapshot()
+    cooling = math.log(END_TEMPERATURE / START_TEMPERATURE)
+
+    while True:
+        done = 0.0
+        if iterations:
+            done = stats['iterations'] / iterations
+        if seconds:
+            done = max(done, (time.monotonic() - start) / seconds)
+        if done >= 1.0:
+            break
+        temperature = START_TEMPERATURE * math.exp(cooling * done)
+        stats['iterations'] += 1
+
+        p = rng.choice(placed)
+        changed_groups.clear()
+        if rng.random() < 0.5:
+            outcome = try_move(p, rng.randrange(DAYS_PER_WEEK), rng.randint(1, SLOTS_PER_DAY))
+        else:
+            outcome = try_swap(p, rng.choice(by_week[p.entry.week_number]))
+        if outcome is None:
+            continue
+
+        delta, undo = outcome
+        # A move must also keep the reported gaps and preference score of its groups
+        if (delta < 0 or rng.random() < math.exp(-delta / temperature)) and no_worse():
+            cost += delta
+            stats['accepted'] += 1
+            if cost < best_cost:
+                best_cost, best = cost, snapshot()
+        else:
+            undo()
+
+    # Return the best schedule seen, never worse than the start in cost or reported metrics
+    if snapshot() != best:
+        for p in placed:
+            unmark(p)
+        for p, cell in zip(placed, best):
+            set_cell(p, *cell)
+            mark(p)
+        cost = best_cost
+
+    # Rooms back to ids for persistence
+    for p in placed:
+        if p.room is not None:
+            p.entry.room_id = state.rooms.rooms[p.room].id
+
+    stats['costAfter'] = cost
+    return stats
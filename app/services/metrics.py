@@ -0,0 +1,60 @@
+"""
+Schedule quality metrics - gaps and preference match
+Computed in a single pass from a prebuilt teacher_subject_id -> teacher_id mapping
+"""
+
+from app.models.teacher_subject import TeacherSubject
+from app.services.occupancy import SLOTS_PER_DAY
+
+
+def build_teacher_lookup(entries):
+    """Map teacher_subject_id -> teacher_id for the given entries with one query"""
+    ids = {entry.teacher_subject_id for entry in entries}
+    if not ids:
+        return {}
+    rows = TeacherSubject.query.with_entities(
+        TeacherSubject.id, TeacherSubject.teacher_id
+    ).filter(TeacherSubject.id.in_(ids)).all()
+    return {ts_id: teacher_id for ts_id, teacher_id in rows}
+
+
+def calculate_gaps(entries, entity_type='teacher', teacher_lookup=None):
+    """Calculate number of gaps (empty slots between classes) for teachers or students"""
+    if not entries:
+        return 0
+
+    if entity_type == 'teacher':
+        if teacher_lookup is None:
+            teacher_lookup = build_teacher_lookup(entries)
+        keys = [(teacher_lookup.get(e.teacher_subject_id), e.week_number, e.day_of_week, e.time_slot)
+                for e in entries]
+    else:
+        keys = [(e.group_id, e.week_number, e.day_of_week, e.time_slot) for e in entries]
+
+    # Sort by (entity, week, day, slot) and diff neighbours within the same day
+    keys = sorted(k for k in keys if k[0] is not None)
+    total_gaps = 0
+    for prev, cur in zip(keys, keys[1:]):
+        if prev[:3] == cur[:3]:
+            gap = cur[3] - prev[3] - 1
+            if gap > 0:
+                total_gaps += gap
+
+    return total_gaps
+
+
+def calculate_preference_score(entries, preference_matrix, teacher_lookup=None):
+    """Calculate percentage of entries matching teacher preferences"""
+    if not entries:
+        return 0.0
+
+    if teacher_lookup is None:
+        teacher_lookup = build_teacher_lookup(entries)
+
+    matched = 0
+    for entry in entries:
+        row = preference_matrix.get(teacher_lookup.get(entry.teacher_subject_id))
+        if row is not None and row[entry.day_of_week * SLOTS_PER_DAY + entry.time_slot - 1] is not None:
+            matched += 1
+
+    return round((matched / len(entries)) * 100, 1)
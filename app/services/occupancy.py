@@ -0,0 +1,234 @@
+"""
+Occupancy engine for the schedule generator
+Every (week, day, slot) cell of the semester grid maps to one bit of an int mask,
+teachers, groups and assignments are interned to dense ints and index plain lists
+"""
+
+from bisect import bisect_left
+
+WEEKS_PER_SEMESTER = 15
+DAYS_PER_WEEK = 5  # Mon-Fri
+SLOTS_PER_DAY = 7  # each 1.5h
+
+CELLS_PER_WEEK = DAYS_PER_WEEK * SLOTS_PER_DAY
+TOTAL_CELLS = WEEKS_PER_SEMESTER * CELLS_PER_WEEK  # 525
+TOTAL_DAYS = WEEKS_PER_SEMESTER * DAYS_PER_WEEK  # 75
+
+DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+
+# Strict daily limit for one subject (max 2 blocks of same subject per day)
+MAX_DAILY_SLOTS_PER_SUBJECT = 2
+
+# Daily limit for an entire group (max 5 blocks total per day) - can be relaxed if needed
+MAX_DAILY_SLOTS_FOR_GROUP = 5
+
+
+def cell_index(week, day, slot):
+    """Dense index of a cell (week 1-15, day 0-4, slot 1-7)"""
+    return ((week - 1) * DAYS_PER_WEEK + day) * SLOTS_PER_DAY + (slot - 1)
+
+
+def cell_bit(week, day, slot):
+    return 1 << cell_index(week, day, slot)
+
+
+def day_mask(week, day):
+    """Mask covering all slots of a single day"""
+    return DAY_MASK << cell_index(week, day, 1)
+
+
+class Interner:
+    """Dense ints 0..n-1 for string ids, in order of first appearance"""
+
+    def __init__(self):
+        self.index = {}
+        self.ids = []
+
+    def __call__(self, value):
+        """Int of value, (number, True) the first time it is seen"""
+        number = self.index.get(value)
+        if number is not None:
+            return number, False
+        number = self.index[value] = len(self.ids)
+        self.ids.append(value)
+        return number, True
+
+    def __getitem__(self, number):
+        return self.ids[number]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Occupancy:
+    """Busy cells per interned entity (teacher or group) kept as int bitmasks"""
+
+    def __init__(self):
+        self.masks = []
+
+    def add(self):
+        self.masks.append(0)
+
+    def mark(self, entity, week, day, slot):
+        self.masks[entity] |= cell_bit(week, day, slot)
+
+    def unmark(self, entity, week, day, slot):
+        self.masks[entity] &= ~cell_bit(week, day, slot)
+
+    def is_busy(self, entity, week, day, slot):
+        return bool(self.masks[entity] & cell_bit(week, day, slot))
+
+    def day_bits(self, entity, week, day):
+        """Busy slots of one day as a 7-bit mask (bit 0 = slot 1)"""
+        return (self.masks[entity] >> cell_index(week, day, 1)) & DAY_MASK
+
+    def has_classes_on_day(self, entity, week, day):
+        return bool(self.masks[entity] & day_mask(week, day))
+
+    def is_adjacent(self, entity, week, day, slot):
+        """Check if the slot directly before or after is busy on the same day"""
+        bit = cell_bit(week, day, slot)
+        neighbours = ((bit >> 1) | (bit << 1)) & day_mask(week, day)
+        return bool(self.masks[entity] & neighbours)
+
+
+class RoomIndex:
+    """Inverted index from cell to occupied rooms, with rooms bucketed by type
+
+    Rooms are identified by their position in the original list, so the
+    lowest free bit is the same room a linear scan of that list would pick;
+    rooms[pos] maps a position back to the Room.
+    """
+
+    def __init__(self, rooms):
+        self.rooms = list(rooms)
+        self.positions = {room.id: i for i, room in enumerate(self.rooms)}
+        self.cells = [0] * TOTAL_CELLS  # mask of occupied room positions per cell
+
+        # Per type: capacities sorted ascending + suffix masks of positions
+        self.buckets = {}
+        by_type = {}
+        for i, room in enumerate(self.rooms):
+            by_type.setdefault(room.type, []).append((room.capacity, i))
+        for room_type, items in by_type.items():
+            items.sort()
+            suffix = [0] * (len(items) + 1)
+            for k in range(len(items) - 1, -1, -1):
+                suffix[k] = suffix[k + 1] | (1 << items[k][1])
+            self.buckets[room_type] = ([capacity for capacity, _ in items], suffix)
+
+    def position(self, room_id):
+        """Interned room, None for a room that is not in the index"""
+        return self.positions.get(room_id)
+
+    def mark(self, pos, week, day, slot):
+        self.cells[cell_index(week, day, slot)] |= 1 << pos
+
+    def unmark(self, pos, week, day, slot):
+        self.cells[cell_index(week, day, slot)] &= ~(1 << pos)
+
+    def is_busy(self, pos, week, day, slot):
+        return bool(self.cells[cell_index(week, day, slot)] & (1 << pos))
+
+    def eligible_contains(self, eligible_mask, pos):
+        return bool(eligible_mask & (1 << pos))
+
+    def eligible(self, room_type, required_capacity):
+        """Mask of rooms of the given type that fit the required capacity"""
+        if room_type not in self.buckets:
+            return 0
+        capacities, suffix = self.buckets[room_type]
+        return suffix[bisect_left(capacities, required_capacity)]
+
+    def first(self, mask):
+        """Lowest set position of mask, None if empty"""
+        if not mask:
+            return None
+        return (mask & -mask).bit_length() - 1
+
+    def find_free(self, eligible_mask, week, day, slot):
+        return self.first(eligible_mask & ~self.cells[cell_index(week, day, slot)])
+
+
+class ScheduleState:
+    """Solver state shared by every group placed in one run
+
+    String ids are interned once when an assignment, group or existing entry
+    is loaded; everything below works on the dense ints. Rooms are interned
+    by their RoomIndex position.
+    """
+
+    def __init__(self, rooms):
+        self.teachers = Occupancy()
+        self.groups = Occupancy()
+        self.rooms = RoomIndex(rooms)
+
+        self.teacher_ids = Interner()
+        self.group_ids = Interner()
+        self.assignment_ids = Interner()
+
+        # Load counters for distribution limits, kept in sync with placed entries
+        self.assignment_week_load = []  # [assignment * 15 + week - 1]
+        self.assignment_day_load = []  # [assignment * 75 + (week - 1) * 5 + day]
+        self.group_day_load = []  # [group * 75 + (week - 1) * 5 + day]
+
+    def teacher(self, teacher_id):
+        number, new = self.teacher_ids(teacher_id)
+        if new:
+            self.teachers.add()
+        return number
+
+    def group(self, group_id):
+        number, new = self.group_ids(group_id)
+        if new:
+            self.groups.add()
+            self.group_day_load.extend([0] * TOTAL_DAYS)
+        return number
+
+    def assignment(self, assignment_id):
+        number, new = self.assignment_ids(assignment_id)
+        if new:
+            self.assignment_week_load.extend([0] * WEEKS_PER_SEMESTER)
+            self.assignment_day_load.extend([0] * TOTAL_DAYS)
+        return number
+
+    def week_load(self, assignment, week):
+        return self.assignment_week_load[assignment * WEEKS_PER_SEMESTER + week - 1]
+
+    def day_load(self, assignment, week, day):
+        return self.assignment_day_load[assignment * TOTAL_DAYS + (week - 1) * DAYS_PER_WEEK + day]
+
+    def group_load(self, group, week, day):
+        return self.group_day_load[group * TOTAL_DAYS + (week - 1) * DAYS_PER_WEEK + day]
+
+    def mark_existing(self, teacher_id, group_id, room_id, week, day, slot):
+        """Mark a cell taken by an entry from another batch, ids as stored in the database"""
+        self.mark_cell(self.teacher(teacher_id), self.group(group_id), self.rooms.position(room_id),
+                       week, day, slot)
+
+    def mark_cell(self, teacher, group, room, week, day, slot):
+        self.teachers.mark(teacher, week, day, slot)
+        self.groups.mark(group, week, day, slot)
+        if room is not None:
+            self.rooms.mark(room, week, day, slot)
+
+    def is_slot_occupied(self, teacher, group, week, day, slot):
+        bit = cell_bit(week, day, slot)
+        return bool((self.teachers.masks[teacher] | self.groups.masks[group]) & bit)
+
+    def mark_slot_occupied(self, teacher, group, room, week, day, slot, assignment):
+        self.mark_cell(teacher, group, room, week, day, slot)
+        self._count(group, week, day, assignment, 1)
+
+    def unmark_slot_occupied(self, teacher, group, room, week, day, slot, assignment):
+        self.teachers.unmark(teacher, week, day, slot)
+        self.groups.unmark(group, week, day, slot)
+        if room is not None:
+            self.rooms.unmark(room, week, day, slot)
+        self._count(group, week, day, assignment, -1)
+
+    def _count(self, group, week, day, assignment, delta):
+        week_day = (week - 1) * DAYS_PER_WEEK + day
+        self.assignment_week_load[assignment * WEEKS_PER_SEMESTER + week - 1] += delta
+        self.assignment_day_load[assignment * TOTAL_DAYS + week_day] += delta
+        self.group_day_load[group * TOTAL_DAYS + week_day] += delta
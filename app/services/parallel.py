@@ -0,0 +1,396 @@
+"""
+Parallel reoptimization of draft schedules
+Groups are split into chunks solved speculatively in separate processes from the same
+occupancy snapshot; collisions between chunks are repaired when the results are merged
+"""
+
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+import multiprocessing
+
+from flask import current_app
+
+from app import db
+from app.models.teacher_subject import TeacherSubject
+from app.models.room import Room
+from app.models.preference import Preference
+from app.models.student_group import StudentGroup
+from app.models.schedule_batch import ScheduleBatch
+from app.services.occupancy import (
+    ScheduleState, DAYS_PER_WEEK, SLOTS_PER_DAY, MAX_DAILY_SLOTS_PER_SUBJECT, MAX_DAILY_SLOTS_FOR_GROUP
+)
+from app.services.persistence import PlannedEntry, entry_rows, insert_entries
+from app.services.profiling import SolverProfile
+
+# Upper bound of a requested chunk count
+MAX_CHUNKS = 64
+
+# Seconds between progress / cancel checks of the parent while chunks are solved
+POLL_INTERVAL = 0.25
+
+# Shared with the chunk workers of one run: solved assignment counter, cancel flag
+_solved = None
+_cancelled = None
+
+
+def parse_chunks(value):
+    """Chunk count from request data, None (config default) when missing or invalid"""
+    try:
+        chunks = int(value or 0)
+    except (TypeError, ValueError):
+        return None
+    return min(chunks, MAX_CHUNKS) if chunks > 0 else None
+
+
+def partition_groups(group_ids, assignments):
+    """Split groups into components that share no teacher; rooms are reconciled at merge"""
+    parent = {g_id: g_id for g_id in group_ids}
+
+    def find(g_id):
+        while parent[g_id] != g_id:
+            parent[g_id] = parent[parent[g_id]]
+            g_id = parent[g_id]
+        return g_id
+
+    owners = {}
+    for a in assignments:
+        if a.teacher_id in owners:
+            parent[find(a.group_id)] = find(owners[a.teacher_id])
+        else:
+            owners[a.teacher_id] = a.group_id
+
+    components = {}
+    for g_id in group_ids:
+        components.setdefault(find(g_id), []).append(g_id)
+    return list(components.values())
+
+
+def make_chunks(components, group_ids, sizes, count):
+    """Pack components into at most count chunks of similar size (sizes: work per group)
+
+    With fewer components than chunks the largest ones are split by groups; teacher
+    collisions between their parts are then repaired at merge like room collisions.
+    Groups keep their group_ids order inside a chunk.
+    """
+    def size(groups):
+        return sum(sizes.get(g_id, 0) for g_id in groups)
+
+    units = [list(c) for c in components]
+    while len(units) < count:
+        largest = max(units, key=size)
+        if len(largest) < 2:
+            break
+        units.remove(largest)
+        half, cut = size(largest) / 2, 1
+        while cut < len(largest) - 1 and size(largest[:cut]) < half:
+            cut += 1
+        units += [largest[:cut], largest[cut:]]
+
+    chunks = [[] for _ in range(min(count, len(units)))]
+    for unit in sorted(units, key=size, reverse=True):
+        min(chunks, key=size).extend(unit)
+    position = {g_id: i for i, g_id in enumerate(group_ids)}
+    for chunk in chunks:
+        chunk.sort(key=position.get)
+    chunks.sort(key=lambda chunk: position[chunk[0]])
+    return chunks
+
+
+def solve_groups(state, group_ids, semester, weights, template=False, profiler=None, on_assignment_done=None):
+    """Place all assignments of the given groups into state, in order"""
+    from app.services.schedule_generator import build_preference_matrix, place_assignments
+
+    if profiler is None:
+        profiler = SolverProfile()
+    with profiler.phase('load'):
+        preference_matrix = build_preference_matrix(Preference.query.all())
+        groups = {g.id: g for g in StudentGroup.query.filter(StudentGroup.id.in_(group_ids)).all()}
+        assignments_by_group = {}
+        for a in TeacherSubject.query.filter(TeacherSubject.group_id.in_(group_ids)).all():
+            assignments_by_group.setdefault(a.group_id, []).append(a)
+
+    results = []
+    for g_id in group_ids:
+        with profiler.phase('load'):
+            group_size = groups[g_id].size if groups[g_id].size > 0 else 1
+        with profiler.phase('placement'):
+            schedule, conflicts = place_assignments(
+                state, assignments_by_group.get(g_id, []), group_size,
+                preference_matrix, weights, on_assignment_done=on_assignment_done,
+                template=template, profiler=profiler
+            )
+        results.append({
+            'groupId': g_id,
+            'entries': [(e.teacher_subject_id, e.subject_id, e.room_id, e.week_number, e.day_of_week, e.time_slot)
+                        for e in schedule],
+            'conflicts': conflicts
+        })
+    return results
+
+
+def _init_chunk_worker(solved, cancelled):
+    global _solved, _cancelled
+    _solved = solved
+    _cancelled = cancelled
+
+
+def _chunk_tick():
+    """Count a solved assignment for the parent's progress, stop when the run was cancelled"""
+    from app.services.jobs import JobCancelled
+
+    if _cancelled.is_set():
+        raise JobCancelled()
+    with _solved.get_lock():
+        _solved.value += 1
+
+
+def _solve_chunk_worker(database_uri, semester, group_ids, snapshot, weights, template, detailed=False):
+    """Solve one chunk in a pool process from an occupancy snapshot; returns (results, profile)"""
+    from app.services.jobs import get_worker_app
+
+    app = get_worker_app(database_uri)
+    profiler = SolverProfile(detailed)
+    with app.app_context():
+        try:
+            with profiler.phase('occupancy'):
+                state = ScheduleState(Room.query.all())
+                for row in snapshot:
+                    state.mark_existing(*row)
+            results = solve_groups(state, group_ids, semester, weights, template, profiler,
+                                   on_assignment_done=_chunk_tick)
+            return results, profiler.to_dict()
+        finally:
+            db.session.remove()
+
+
+def _repair_cell(state, teacher, group, a, base_prefs, eligible, weights, week):
+    """Best free (day, slot, room) of the week for a displaced block, None if there is none"""
+    from app.services.schedule_generator import score_slot
+
+    best = None
+    for day in range(DAYS_PER_WEEK):
+        if state.day_load(a, week, day) >= MAX_DAILY_SLOTS_PER_SUBJECT or \
+                state.group_load(group, week, day) >= MAX_DAILY_SLOTS_FOR_GROUP:
+            continue
+        for slot in range(1, SLOTS_PER_DAY + 1):
+            if state.is_slot_occupied(teacher, group, week, day, slot):
+                continue
+            score = score_slot(state, teacher, group, base_prefs[day * SLOTS_PER_DAY + slot - 1], weights,
+                               week, day, slot)
+            if best is not None and score <= best[0]:
+                continue
+            room = state.rooms.find_free(eligible, week, day, slot)
+            if room is not None:
+                best = (score, day, slot, room)
+    return best and best[1:]
+
+
+def merge_group(state, result, assignments_by_id, eligible_by_id, preference_matrix, weights):
+    """Mark a speculatively solved group in the merged state, repairing collisions
+
+    A taken room is swapped for another free eligible room of the same cell; a block
+    whose teacher is taken (or with no free room) moves to the best free cell of its
+    week, chosen by _repair_cell instead of the solver. Returns (room swaps, moved
+    entries), None if a block could not be placed; the group is then left unmarked.
+    """
+    from app.services.schedule_generator import get_preference_score
+
+    group = state.group(result['groupId'])
+    merged = []
+    displaced = []
+    room_swaps = 0
+    for ts_id, subject_id, room_id, week, day, slot in result['entries']:
+        teacher = state.teacher(assignments_by_id[ts_id].teacher_id)
+        a = state.assignment(ts_id)
+        if state.is_slot_occupied(teacher, group, week, day, slot):
+            displaced.append((ts_id, subject_id, week))
+            continue
+        room = state.rooms.position(room_id)
+        if room is not None and state.rooms.is_busy(room, week, day, slot):
+            room = state.rooms.find_free(eligible_by_id[ts_id], week, day, slot)
+            if room is None:
+                displaced.append((ts_id, subject_id, week))
+                continue
+            room_swaps += 1
+        state.mark_slot_occupied(teacher, group, room, week, day, slot, a)
+        merged.append((teacher, room, week, day, slot, a,
+                       (ts_id, subject_id, state.rooms.rooms[room].id if room is not None else None,
+                        week, day, slot)))
+
+    for ts_id, subject_id, week in displaced:
+        assignment = assignments_by_id[ts_id]
+        teacher = state.teacher(assignment.teacher_id)
+        a = state.assignment(ts_id)
+        base_prefs = [get_preference_score(preference_matrix, assignment.teacher_id, day, slot) * 10 - (slot - 1) * 0.1
+                      for day in range(DAYS_PER_WEEK) for slot in range(1, SLOTS_PER_DAY + 1)]
+        cell = _repair_cell(state, teacher, group, a, base_prefs, eligible_by_id[ts_id], weights, week)
+        if cell is None:
+            for teacher, room, week, day, slot, a, _ in merged:
+                state.unmark_slot_occupied(teacher, group, room, week, day, slot, a)
+            return None
+        day, slot, room = cell
+        state.mark_slot_occupied(teacher, group, room, week, day, slot, a)
+        merged.append((teacher, room, week, day, slot, a,
+                       (ts_id, subject_id, state.rooms.rooms[room].id, week, day, slot)))
+
+    result['entries'] = [m[-1] for m in merged]
+    return room_swaps, len(displaced)
+
+
+def reoptimize_parallel(batches, semester, weights, progress=None, local_search=None, template=False,
+                        profiler=None, chunks=None):
+    """Re-optimize draft batches of one semester, chunks of groups in parallel
+
+    Chunks are solved from the same snapshot, so their results may collide: merge_group
+    repairs them in chunk order and a group it cannot repair is solved again on the
+    merged state. Results depend on the number of chunks (chunks, default
+    SCHEDULE_PARALLEL_CHUNKS), not on SCHEDULE_SOLVER_PROCESSES or whether a pool is used.
+    local_search is the budget of one search over all groups after the merge.
+    progress(done, total) is called while chunks are solved; when it raises, the workers
+    stop at their next assignment and the exception propagates.
+    Worker profiles are merged into profiler, so its phases add up CPU time of all processes.
+    """
+    from app.services.schedule_generator import (
+        apply_batch_metrics, build_preference_matrix, fetch_existing_occupancy, get_eligible_rooms,
+        make_progress_counter, run_local_search
+    )
+
+    if profiler is None:
+        profiler = SolverProfile()
+    with profiler.phase('load'):
+        group_ids = list(dict.fromkeys(b.group_id for b in batches))
+        rooms = Room.query.all()
+        groups = StudentGroup.query.filter(StudentGroup.id.in_(group_ids)).all()
+        group_sizes = {g.id: g.size if g.size > 0 else 1 for g in groups}
+        assignments = TeacherSubject.query.filter(TeacherSubject.group_id.in_(group_ids)).all()
+        teacher_lookup = {a.id: a.teacher_id for a in assignments}
+        assignments_by_id = {a.id: a for a in assignments}
+        preference_matrix = build_preference_matrix(Preference.query.all())
+        group_ids = [g_id for g_id in group_ids if g_id in group_sizes]
+
+        assignment_counts = {}
+        for a in assignments:
+            assignment_counts[a.group_id] = assignment_counts.get(a.group_id, 0) + 1
+        total_assignments = len(assignments)
+
+        components = partition_groups(group_ids, assignments)
+        chunk_count = max(1, chunks or current_app.config.get('SCHEDULE_PARALLEL_CHUNKS', 4))
+        group_chunks = make_chunks(components, group_ids, assignment_counts, chunk_count)
+    with profiler.phase('occupancy'):
+        snapshot = [tuple(row) for row in fetch_existing_occupancy(semester, group_ids)]
+
+    # Solve chunks speculatively from the same snapshot
+    max_workers = min(len(group_chunks), max(1, current_app.config.get('SCHEDULE_SOLVER_PROCESSES', 1)))
+    if max_workers > 1:
+        context = multiprocessing.get_context('spawn')
+        database_uri = current_app.config['SQLALCHEMY_DATABASE_URI']
+        solved = context.Value('i', 0)
+        cancelled = context.Event()
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                       initializer=_init_chunk_worker, initargs=(solved, cancelled))
+        try:
+            futures = [executor.submit(_solve_chunk_worker, database_uri, semester, chunk, snapshot, weights,
+                                       template, profiler.detailed)
+                       for chunk in group_chunks]
+            pending = futures
+            while pending:
+                finished, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_EXCEPTION)
+                if any(future.exception() is not None for future in finished):
+                    break
+                if progress:
+                    progress(solved.value, total_assignments)
+            chunk_results = []
+            for future in futures:
+                results, profile = future.result()
+                profiler.add(profile)
+                chunk_results.append(results)
+        except BaseException:
+            cancelled.set()
+            raise
+        finally:
+            executor.shutdown(cancel_futures=True)
+    else:
+        tick = make_progress_counter(progress, total_assignments)
+        chunk_results = []
+        for chunk in group_chunks:
+            with profiler.phase('occupancy'):
+                state = ScheduleState(rooms)
+                for row in snapshot:
+                    state.mark_existing(*row)
+            chunk_results.append(solve_groups(state, chunk, semester, weights, template, profiler,
+                                              on_assignment_done=tick))
+
+    # Merge in chunk order, repairing collisions with the chunks merged before
+    with profiler.phase('occupancy'):
+        state = ScheduleState(rooms)
+        for row in snapshot:
+            state.mark_existing(*row)
+        eligible_by_id = {a.id: get_eligible_rooms(state.rooms, a.subject.type, group_sizes[a.group_id])
+                          for a in assignments}
+
+    merged = []
+    room_swaps = 0
+    moved = 0
+    reconciled = 0
+    for results in chunk_results:
+        for result in results:
+            with profiler.phase('merge'):
+                counts = merge_group(state, result, assignments_by_id, eligible_by_id, preference_matrix, weights)
+            if counts is None:
+                result = solve_groups(state, [result['groupId']], semester, weights, template, profiler)[0]
+                reconciled += 1
+            else:
+                room_swaps += counts[0]
+                moved += counts[1]
+            merged.append(result)
+    if progress:
+        progress(total_assignments, total_assignments)
+
+    schedules = [[PlannedEntry(assignments_by_id[ts_id], room_id, week, day, slot)
+                  for ts_id, _, room_id, week, day, slot in result['entries']]
+                 for result in merged]
+    # One search over the merged groups, so it sees the cells taken by every chunk
+    if local_search:
+        with profiler.phase('localSearch'):
+            run_local_search(state, [e for schedule in schedules for e in schedule], assignments, group_sizes,
+                             preference_matrix, weights, local_search)
+
+    # Persist everything in one transaction
+    with profiler.phase('persistence'):
+        old_drafts = ScheduleBatch.query.filter(
+            ScheduleBatch.group_id.in_(group_ids),
+            ScheduleBatch.semester == semester,
+            ScheduleBatch.status == 'DRAFT'
+        ).all()
+        for old in old_drafts:
+            db.session.delete(old)
+        db.session.flush()
+
+    new_batches = []
+    entries_counts = []
+    for result, schedule in zip(merged, schedules):
+        with profiler.phase('persistence'):
+            batch = ScheduleBatch(
+                semester=semester,
+                group_id=result['groupId'],
+                status='DRAFT'
+            )
+            db.session.add(batch)
+            db.session.flush()  # Get the ID
+            insert_entries(entry_rows(schedule, batch.id, semester))
+        with profiler.phase('metrics'):
+            apply_batch_metrics(batch, schedule, preference_matrix, teacher_lookup)
+        new_batches.append(batch)
+        entries_counts.append(len(schedule))
+
+    with profiler.phase('persistence'):
+        db.session.commit()
+
+    return {
+        'batches': [b.to_dict(entries_count=n) for b, n in zip(new_batches, entries_counts)],
+        'conflictsCount': sum(len(result['conflicts']) for result in merged),
+        'components': len(components),
+        'chunks': len(group_chunks),
+        'roomSwaps': room_swaps,
+        'moved': moved,
+        'reconciled': reconciled
+    }
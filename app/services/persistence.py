@@ -0,0 +1,95 @@
+"""
+Persistence of planned schedule entries
+The solver works on light PlannedEntry objects; they become rows of one bulk
+INSERT and are serialized from the in-memory plan
+"""
+
+from datetime import datetime
+import uuid
+
+from sqlalchemy import insert
+
+from app import db
+from app.models.schedule_entry import ScheduleEntry
+
+
+class PlannedEntry:
+    """One placed lesson during the search, same attribute names as ScheduleEntry"""
+    __slots__ = ('assignment', 'room_id', 'week_number', 'day_of_week', 'time_slot')
+
+    def __init__(self, assignment, room_id, week_number, day_of_week, time_slot):
+        self.assignment = assignment
+        self.room_id = room_id
+        self.week_number = week_number
+        self.day_of_week = day_of_week
+        self.time_slot = time_slot
+
+    @property
+    def teacher_subject_id(self):
+        return self.assignment.id
+
+    @property
+    def subject_id(self):
+        return self.assignment.subject_id
+
+    @property
+    def group_id(self):
+        return self.assignment.group_id
+
+
+def entry_rows(schedule, batch_id, semester):
+    """Column mappings of planned entries, ids generated up front"""
+    now = datetime.utcnow()
+    return [{
+        'id': str(uuid.uuid4())[:25],
+        'batch_id': batch_id,
+        'semester': semester,
+        'week_number': e.week_number,
+        'day_of_week': e.day_of_week,
+        'time_slot': e.time_slot,
+        'room_id': e.room_id,
+        'teacher_subject_id': e.teacher_subject_id,
+        'subject_id': e.subject_id,
+        'group_id': e.group_id,
+        'created_at': now,
+        'updated_at': now
+    } for e in schedule]
+
+
+def insert_entries(rows):
+    """Write all rows with a single executemany INSERT"""
+    if rows:
+        db.session.execute(insert(ScheduleEntry), rows)
+
+
+def build_entry_lookup(rooms, assignments, groups):
+    """Names needed by serialize_entries, read while the objects are still loaded"""
+    return {
+        'rooms': {r.id: {'name': r.name, 'type': r.type} for r in rooms},
+        'assignments': {a.id: {
+            'subject': {'name': a.subject.name, 'type': a.subject.type},
+            'teacher': {'name': a.teacher.name}
+        } for a in assignments},
+        'groups': {g.id: {'id': g.id, 'name': g.name} for g in groups}
+    }
+
+
+def serialize_entries(rows, lookup, is_published=False):
+    """Same output as ScheduleEntry.to_dict, sorted by week, day and slot"""
+    result = []
+    for row in sorted(rows, key=lambda r: (r['week_number'], r['day_of_week'], r['time_slot'])):
+        assignment = lookup['assignments'][row['teacher_subject_id']]
+        result.append({
+            'id': row['id'],
+            'batchId': row['batch_id'],
+            'semester': row['semester'],
+            'weekNumber': row['week_number'],
+            'dayOfWeek': row['day_of_week'],
+            'timeSlot': row['time_slot'],
+            'isPublished': is_published,
+            'room': lookup['rooms'][row['room_id']],
+            'subject': assignment['subject'],
+            'group': lookup['groups'][row['group_id']],
+            'teacherSubject': {'teacher': assignment['teacher']}
+        })
+    return result
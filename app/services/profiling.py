@@ -0,0 +1,70 @@
+"""
+Per-phase timing and counters of solver runs
+Phases and rare events are always recorded and logged as one JSON line per run;
+scoring / room search timing wraps the inner loop and is only on when requested
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('assignments', 'entries', 'conflicts', 'groupLimitRelaxations', 'weekOffsetEscalations')
+DETAILED_COUNTERS = ('candidatesEvaluated', 'roomSearches')
+
+
+class SolverProfile:
+    """Durations (seconds) per phase and event counters of one run
+
+    Phases: load, occupancy, placement, localSearch, persistence, metrics;
+    with detailed=True also scoring and roomSearch, both nested in placement.
+    """
+
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.phases = Counter()
+        self.counters = Counter(dict.fromkeys(COUNTERS + (DETAILED_COUNTERS if detailed else ()), 0))
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def timed(self, phase, counter, fn):
+        """fn with its calls counted and timed, fn itself when not detailed"""
+        if not self.detailed:
+            return fn
+        phases, counters = self.phases, self.counters
+
+        def wrapper(*args):
+            start = time.perf_counter()
+            result = fn(*args)
+            phases[phase] += time.perf_counter() - start
+            counters[counter] += 1
+            return result
+        return wrapper
+
+    def add(self, data):
+        """Merge a to_dict() result, e.g. from a worker process or a nested run"""
+        for name, ms in data.get('phasesMs', {}).items():
+            self.phases[name] += ms / 1000
+        self.counters.update(data.get('counters', {}))
+
+    def to_dict(self):
+        return {
+            'phasesMs': {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            'counters': dict(self.counters)
+        }
+
+    def log(self, operation, **context):
+        data = {'event': 'solver_profile', 'operation': operation, **context, **self.to_dict()}
+        logger.info(json.dumps(data, sort_keys=True), extra={'profile': data})
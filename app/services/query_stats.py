@@ -0,0 +1,106 @@
+"""
+SQL query statistics per request (opt-in with SQL_QUERY_STATS)
+Engine events count statements and database time of each request; slow statements
+are logged with their endpoint and totals are aggregated per endpoint in-process
+"""
+
+import logging
+import re
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Logged statements are cut to this many characters
+MAX_STATEMENT_LENGTH = 500
+
+_lock = threading.Lock()
+_endpoints = {}
+
+
+def init_query_stats(app, engine):
+    """Hook the engine and request cycle of app; no-op unless SQL_QUERY_STATS is set"""
+    if not app.config.get('SQL_QUERY_STATS'):
+        return
+    slow_seconds = app.config.get('SQL_SLOW_QUERY_MS', 100) / 1000
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        endpoint = None
+        if has_request_context():
+            endpoint = request.endpoint
+            stats = g.get('query_stats')
+            if stats is not None:
+                stats['queries'] += 1
+                stats['seconds'] += elapsed
+                if elapsed >= slow_seconds:
+                    stats['slow'] += 1
+        if elapsed >= slow_seconds:
+            text = re.sub(r'\s+', ' ', statement).strip()[:MAX_STATEMENT_LENGTH]
+            logger.warning('Slow query %.1f ms [%s]: %s', elapsed * 1000, endpoint, text)
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = {'queries': 0, 'seconds': 0.0, 'slow': 0, 'start': time.perf_counter()}
+
+    @app.after_request
+    def finish_query_stats(response):
+        """Streamed bodies run their queries after this point and are counted only up to here"""
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        total = time.perf_counter() - stats['start']
+        record(request.endpoint or 'unknown', stats['queries'], stats['seconds'], total, stats['slow'])
+        response.headers.add('Server-Timing', 'db;dur=%.1f;desc="%d queries"' % (
+            stats['seconds'] * 1000, stats['queries']))
+        response.headers.add('Server-Timing', 'app;dur=%.1f' % (total * 1000))
+        return response
+
+
+def record(endpoint, queries, db_seconds, total_seconds, slow=0):
+    with _lock:
+        item = _endpoints.get(endpoint)
+        if item is None:
+            item = _endpoints[endpoint] = {
+                'requests': 0, 'queries': 0, 'maxQueries': 0, 'slowQueries': 0,
+                'dbSeconds': 0.0, 'maxDbSeconds': 0.0, 'totalSeconds': 0.0
+            }
+        item['requests'] += 1
+        item['queries'] += queries
+        item['maxQueries'] = max(item['maxQueries'], queries)
+        item['slowQueries'] += slow
+        item['dbSeconds'] += db_seconds
+        item['maxDbSeconds'] = max(item['maxDbSeconds'], db_seconds)
+        item['totalSeconds'] += total_seconds
+
+
+def endpoint_stats():
+    """Aggregates per endpoint, most queries per request first"""
+    with _lock:
+        items = [(endpoint, dict(item)) for endpoint, item in _endpoints.items()]
+    result = [{
+        'endpoint': endpoint,
+        'requests': item['requests'],
+        'queries': item['queries'],
+        'avgQueries': round(item['queries'] / item['requests'], 1),
+        'maxQueries': item['maxQueries'],
+        'slowQueries': item['slowQueries'],
+        'avgDbMs': round(item['dbSeconds'] * 1000 / item['requests'], 1),
+        'maxDbMs': round(item['maxDbSeconds'] * 1000, 1),
+        'avgMs': round(item['totalSeconds'] * 1000 / item['requests'], 1)
+    } for endpoint, item in items]
+    result.sort(key=lambda x: x['avgQueries'], reverse=True)
+    return result
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
@@ -0,0 +1,152 @@
+"""
+Response cache for published schedules
+Serialized JSON is kept per (view, semester, data version) with LRU eviction
+bounded by entry count and total body bytes,
+rendered calendar feeds per group / teacher until the data version changes
+"""
+
+from collections import OrderedDict
+import hashlib
+import threading
+
+from flask import current_app, request
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.user import User
+from app.models.room import Room
+from app.models.subject import Subject
+from app.models.student_group import StudentGroup
+from app.models.teacher_subject import TeacherSubject
+from app.models.schedule_batch import ScheduleBatch
+
+# Edits of these models change names shown in published schedules
+WATCHED_MODELS = (User, Room, Subject, StudentGroup, TeacherSubject)
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_entries_bytes = 0
+_feeds = {}  # (kind, id) -> (version, body, etag)
+_generation = 0
+
+
+def _edit_columns():
+    for model in WATCHED_MODELS:
+        yield select(func.count()).select_from(model).scalar_subquery()
+        yield select(func.max(model.updated_at)).scalar_subquery()
+
+
+def data_version(semester=None):
+    """Changes whenever a batch of the semester (any semester for None) is published or a published one
+    disappears, and whenever a watched row is added, edited or deleted, also by another process"""
+    published = (ScheduleBatch.status == 'PUBLISHED',)
+    if semester is not None:
+        published += (ScheduleBatch.semester == semester,)
+    return tuple(db.session.execute(select(
+        select(func.count(ScheduleBatch.id)).where(*published).scalar_subquery(),
+        select(func.max(ScheduleBatch.published_at)).where(*published).scalar_subquery(),
+        *_edit_columns()
+    )).one())
+
+
+def invalidate():
+    """Drop every cached response of this process"""
+    global _generation, _entries_bytes
+    with _lock:
+        _generation += 1
+        _entries.clear()
+        _entries_bytes = 0
+        _feeds.clear()
+
+
+def _get(key):
+    with _lock:
+        if key not in _entries:
+            return None
+        _entries.move_to_end(key)
+        return _entries[key]
+
+
+def _put(key, value):
+    global _entries_bytes
+    max_size = current_app.config.get('SCHEDULE_CACHE_SIZE', 256)
+    max_bytes = current_app.config.get('SCHEDULE_CACHE_BYTES', 64 * 1024 * 1024)
+    size = len(value[0])
+    if size > max_bytes:
+        return  # would evict everything else
+    with _lock:
+        if key[-1] != _generation:
+            return  # invalidated while the response was being built
+        old = _entries.pop(key, None)
+        if old is not None:
+            _entries_bytes -= len(old[0])
+        _entries[key] = value
+        _entries_bytes += size
+        while len(_entries) > max_size or _entries_bytes > max_bytes:
+            _, evicted = _entries.popitem(last=False)
+            _entries_bytes -= len(evicted[0])
+
+
+def get_feed(key, version):
+    """Rendered feed (body, etag) if it was built at this data version, None otherwise"""
+    with _lock:
+        cached = _feeds.get(key)
+    if cached is None or cached[0] != version:
+        return None
+    return cached[1:]
+
+
+def put_feed(key, version, body):
+    """version must be read before the feed was built, so a publish during the build is not missed"""
+    etag = hashlib.sha1(body).hexdigest()
+    with _lock:
+        _feeds[key] = (version, body, etag)
+    return body, etag
+
+
+def _build(build):
+    body = current_app.json.response(build()).get_data()
+    return body, hashlib.sha1(body).hexdigest()
+
+
+def json_response(key, semester, build):
+    """JSON response with a strong ETag, answered with 304 when the client copy matches
+
+    key identifies the view, e.g. ('group', group_id); None skips the server cache.
+    build() returns the data to serialize and is only called on a miss.
+    """
+    if key is None:
+        body, etag = _build(build)
+    else:
+        cache_key = (*key, semester, data_version(semester), _generation)
+        cached = _get(cache_key)
+        if cached is None:
+            cached = _build(build)
+            _put(cache_key, cached)
+        body, etag = cached
+
+    response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_edited(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, WATCHED_MODELS):
+            session.info['schedule_cache_stale'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_edit(session):
+    """After the commit, so a response built in between cannot be cached with the old names"""
+    if session.info.pop('schedule_cache_stale', False):
+        invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_edit(session):
+    session.info.pop('schedule_cache_stale', None)
@@ -4,19 +4,37 @@ Enhanced with draft/publish workflow and optimization metrics
 """
 
 from app import db
+from app.models.user import User
 from app.models.teacher_subject import TeacherSubject
 from app.models.room import Room
 from app.models.preference import Preference
 from app.models.student_group import StudentGroup
 from app.models.schedule_batch import ScheduleBatch
 from app.models.schedule_entry import ScheduleEntry
+from app.services.local_search import improve_schedule, split_budget
+from app.services.metrics import calculate_gaps, calculate_preference_score
+from app.services.schedule_cache import invalidate
+from app.services.calendar_feed import warm_feeds
+from app.services.profiling import SolverProfile
+from app.services.telemetry import record_published, record_solver_run
+from app.services.persistence import (
+    PlannedEntry, build_entry_lookup, entry_rows, insert_entries, serialize_entries
+)
+from app.services.occupancy import (
+    ScheduleState, WEEKS_PER_SEMESTER, DAYS_PER_WEEK, SLOTS_PER_DAY, CELLS_PER_WEEK, cell_bit, cell_index,
+    MAX_DAILY_SLOTS_PER_SUBJECT, MAX_DAILY_SLOTS_FOR_GROUP
+)
 from datetime import datetime
+from sqlalchemy import and_, func, or_
 import math
+import time
 
 # Constants
-WEEKS_PER_SEMESTER = 15
-TIME_SLOTS = [1, 2, 3, 4, 5, 6, 7]  # 7 slots per day, each 1.5h
-DAYS = [0, 1, 2, 3, 4]  # Mon-Fri
+TIME_SLOTS = list(range(1, SLOTS_PER_DAY + 1))  # 7 slots per day, each 1.5h
+DAYS = list(range(DAYS_PER_WEEK))  # Mon-Fri
+DEFAULT_WEIGHTS = {'preferences': 2, 'teacher_gaps': 2, 'student_gaps': 2}
+# Template mode: largest share of a pattern's weeks in which its cell may leave a gap
+TEMPLATE_MAX_GAP_SHARE = 0.5
 
 
 def get_current_semester():
@@ -28,270 +46,307 @@ def get_current_semester():
     return 'WINTER'
 
 
-def find_suitable_room(rooms, subject_type, required_capacity, occupied_rooms):
-    """Find an available room matching requirements"""
+def get_eligible_rooms(room_index, subject_type, required_capacity):
+    """Get mask of rooms matching subject type and capacity"""
     room_type = 'LAB' if subject_type == 'LAB' else 'LECTURE'
-    for room in rooms:
-        if room.type == room_type and room.capacity >= required_capacity and room.id not in occupied_rooms:
-            return room
-    return None
+    return room_index.eligible(room_type, required_capacity)
 
 
-def get_preference_score(preferences, teacher_id, day, slot):
-    """Get preference score for a time slot"""
+def find_suitable_room(room_index, eligible_rooms, week, day, slot):
+    """Position of an available room among eligible ones, None if all are taken"""
+    return room_index.find_free(eligible_rooms, week, day, slot)
+
+
+def build_preference_matrix(preferences):
+    """Index preferences once into a per-teacher 5x7 priority matrix (flat list, None = no preference)"""
+    matrix = {}
     for pref in preferences:
-        if pref.teacher_id == teacher_id and pref.day_of_week == day and pref.time_slot == slot:
-            return pref.priority
-    return 0
+        if not (0 <= pref.day_of_week < DAYS_PER_WEEK and 1 <= pref.time_slot <= SLOTS_PER_DAY):
+            continue
+        row = matrix.setdefault(pref.teacher_id, [None] * CELLS_PER_WEEK)
+        i = pref.day_of_week * SLOTS_PER_DAY + pref.time_slot - 1
+        if row[i] is None:  # first matching preference wins
+            row[i] = pref.priority
+    return matrix
 
 
-def calculate_gaps(entries, entity_type='teacher'):
-    """Calculate number of gaps (empty slots between classes) for teachers or students"""
-    total_gaps = 0
-    
-    if not entries:
-        return total_gaps
-    
-    # Group entries by day and week
-    entity_entries = {}
-    for entry in entries:
-        if entity_type == 'teacher':
-            # Get teacher_id from teacher_subject
-            ts = TeacherSubject.query.get(entry.teacher_subject_id)
-            key = ts.teacher_id if ts else None
+def get_preference_score(preference_matrix, teacher_id, day, slot):
+    """Get preference score for a time slot"""
+    row = preference_matrix.get(teacher_id)
+    if row is None:
+        return 0
+    priority = row[day * SLOTS_PER_DAY + slot - 1]
+    return priority if priority is not None else 0
+
+
+def get_max_preference(preference_matrix, teacher_id):
+    """Get highest preference priority of a teacher"""
+    row = preference_matrix.get(teacher_id)
+    if row is None:
+        return 0
+    return max([0] + [p for p in row if p is not None])
+
+
+def fetch_existing_occupancy(semester, exclude_group_ids):
+    """Get (teacher, group, room, week, day, slot) rows of PUBLISHED batches and DRAFT batches of other groups"""
+    return db.session.query(
+        TeacherSubject.teacher_id,
+        ScheduleEntry.group_id,
+        ScheduleEntry.room_id,
+        ScheduleEntry.week_number,
+        ScheduleEntry.day_of_week,
+        ScheduleEntry.time_slot
+    ).join(ScheduleBatch, ScheduleEntry.batch_id == ScheduleBatch.id).join(
+        TeacherSubject, ScheduleEntry.teacher_subject_id == TeacherSubject.id
+    ).filter(
+        ScheduleBatch.semester == semester,
+        or_(
+            ScheduleBatch.status == 'PUBLISHED',
+            and_(ScheduleBatch.status == 'DRAFT', ScheduleBatch.group_id.notin_(exclude_group_ids))
+        )
+    ).all()
+
+
+def load_existing_occupancy(state, semester, exclude_group_ids):
+    """Mark cells taken by PUBLISHED batches and DRAFT batches of other groups"""
+    for teacher_id, g_id, room_id, week, day, slot in fetch_existing_occupancy(semester, exclude_group_ids):
+        state.mark_existing(teacher_id, g_id, room_id, week, day, slot)
+
+
+def score_slot(state, teacher, group, base_pref, weights, week, day, slot):
+    """Score a candidate cell for interned teacher / group; higher is better"""
+    # Calculate Dynamic Score based on Weights
+    w_pref = weights.get('preferences', 2)
+    w_t = weights.get('teacher_gaps', 2)
+    w_s = weights.get('student_gaps', 2)
+    
+    score = base_pref * w_pref * 2
+    
+    # === LOAD BALANCING: Prefer days with fewer classes ===
+    # Count ALL classes for this group on this day (across all subjects)
+    day_load = state.group_load(group, week, day)
+    # Heavy penalty for adding to already busy days - encourages spreading across all weekdays
+    score -= day_load * 50
+    
+    # === MORNING PREFERENCE: Prefer earlier time slots ===
+    # Slot 1 (8:00) = +60 bonus, Slot 7 (18:00) = 0 bonus
+    # This makes algorithm prefer morning classes over evening ones
+    morning_bonus = (8 - slot) * 10
+    score += morning_bonus
+    
+    # Teacher Gaps Analysis
+    if state.teachers.has_classes_on_day(teacher, week, day):
+        if state.teachers.is_adjacent(teacher, week, day, slot):
+            score += 40 * w_t # Bonus for compactness
+        else: 
+            score -= 30 * w_t # Penalty for gap
+            
+    # Student Gaps Analysis
+    if state.groups.has_classes_on_day(group, week, day):
+        if state.groups.is_adjacent(group, week, day, slot):
+            score += 40 * w_s
         else:
-            key = entry.group_id
+            score -= 30 * w_s
+    
+    return score
+
+
+def solver_steps(profiler):
+    """score_slot and find_suitable_room, counted and timed under detailed profiling"""
+    if profiler is None:
+        return score_slot, find_suitable_room
+    return (profiler.timed('scoring', 'candidatesEvaluated', score_slot),
+            profiler.timed('roomSearch', 'roomSearches', find_suitable_room))
+
+
+def creates_gap(state, teacher, group, week, day, slot):
+    """True if the cell is not next to a class of a teacher / group that already has classes that day"""
+    return any(index.has_classes_on_day(entity, week, day) and not index.is_adjacent(entity, week, day, slot)
+               for index, entity in ((state.teachers, teacher), (state.groups, group)))
+
+
+def template_patterns(remaining, week_interval):
+    """Week patterns for template mode: (blocks, list of week lists to choose from)"""
+    if week_interval == 1:
+        # Weekly: every full block of 15 repeats in all weeks
+        return remaining // WEEKS_PER_SEMESTER, [list(range(1, WEEKS_PER_SEMESTER + 1))]
+    # Bi-weekly (or sparser): one block every week_interval weeks, any starting offset
+    patterns = [list(range(1 + offset, WEEKS_PER_SEMESTER + 1, week_interval))[:remaining]
+                for offset in range(week_interval)]
+    return 1, [weeks for weeks in patterns if weeks]
+
+
+def place_template_blocks(state, assignment, weekly_slot_scores, eligible_rooms, weights,
+                          blocks, patterns, max_slots_per_week, profiler=None):
+    """Place recurring blocks: one (day, slot) cell repeated in every week of a pattern"""
+    score_cell, find_room = solver_steps(profiler)
+    teacher = state.teacher(assignment.teacher_id)
+    group = state.group(assignment.group_id)
+    a = state.assignment(assignment.id)
+    pattern_bits = {}
+    placed = []
+    
+    for _ in range(blocks):
+        best_candidate = None
+        best_score = -float('inf')
+        busy = state.teachers.masks[teacher] | state.groups.masks[group]
         
-        if key is None:
-            continue
-            
-        if key not in entity_entries:
-            entity_entries[key] = {}
+        for weeks in patterns:
+            for day, slot, base_pref in weekly_slot_scores:
+                key = (weeks[0], len(weeks), day, slot)
+                if key not in pattern_bits:
+                    pattern_bits[key] = sum(cell_bit(week, day, slot) for week in weeks)
+                if busy & pattern_bits[key]:
+                    continue
+                
+                # Same limits as per-week search, group limit is never relaxed here
+                if any(state.week_load(a, week) >= max_slots_per_week or
+                       state.day_load(a, week, day) >= MAX_DAILY_SLOTS_PER_SUBJECT or
+                       state.group_load(group, week, day) >= MAX_DAILY_SLOTS_FOR_GROUP
+                       for week in weeks):
+                    continue
+                
+                # Prefer one room for the whole pattern, otherwise any free room per week
+                taken = 0
+                for week in weeks:
+                    taken |= state.rooms.cells[cell_index(week, day, slot)]
+                shared = state.rooms.first(eligible_rooms & ~taken)
+                if shared is not None:
+                    rooms = [shared] * len(weeks)
+                else:
+                    rooms = [find_room(state.rooms, eligible_rooms, week, day, slot) for week in weeks]
+                    if None in rooms:
+                        continue
+                
+                # A cell leaving a gap in too many weeks is left to per-week search
+                gap_weeks = sum(1 for week in weeks if creates_gap(state, teacher, group, week, day, slot))
+                if gap_weeks > len(weeks) * TEMPLATE_MAX_GAP_SHARE:
+                    continue
+                
+                score = sum(score_cell(state, teacher, group, base_pref, weights, week, day, slot)
+                            for week in weeks) / len(weeks)
+                if score > best_score:
+                    best_score = score
+                    best_candidate = (weeks, day, slot, rooms)
         
-        day_key = f"{entry.week_number}-{entry.day_of_week}"
-        if day_key not in entity_entries[key]:
-            entity_entries[key][day_key] = []
-        entity_entries[key][day_key].append(entry.time_slot)
-    
-    # Count gaps for each entity
-    for entity_id, days in entity_entries.items():
-        for day_key, slots in days.items():
-            slots.sort()
-            if len(slots) > 1:
-                for i in range(len(slots) - 1):
-                    gap = slots[i + 1] - slots[i] - 1
-                    if gap > 0:
-                        total_gaps += gap
-    
-    return total_gaps
-
-
-def calculate_preference_score(entries, preferences):
-    """Calculate percentage of entries matching teacher preferences"""
-    if not entries:
-        return 0.0
-    
-    matched = 0
-    total = len(entries)
-    
-    for entry in entries:
-        ts = TeacherSubject.query.get(entry.teacher_subject_id)
-        if not ts:
-            continue
-        teacher_id = ts.teacher_id
-        for pref in preferences:
-            if (pref.teacher_id == teacher_id and 
-                pref.day_of_week == entry.day_of_week and 
-                pref.time_slot == entry.time_slot):
-                matched += 1
-                break
+        if not best_candidate:
+            break
+        
+        weeks, day, slot, rooms = best_candidate
+        for week, room in zip(weeks, rooms):
+            placed.append(PlannedEntry(assignment, state.rooms.rooms[room].id, week, day, slot))
+            state.mark_slot_occupied(teacher, group, room, week, day, slot, a)
     
-    return round((matched / total) * 100, 1) if total > 0 else 0.0
+    return placed
 
 
-def generate_schedule(group_id, semester=None, resolved_conflicts=None, existing_batch_id=None, weights=None):
-    """Generate schedule for a student group with weighted optimization"""
-    if semester is None:
-        semester = get_current_semester()
-    
-    if weights is None:
-        weights = {'preferences': 2, 'teacher_gaps': 2, 'student_gaps': 2}
+def assignment_plan(state, assignment, group_size, preference_matrix):
+    """Search parameters of one assignment: interned ids, blocks needed, rooms, cell order and limits"""
+    slots_needed = math.ceil(assignment.subject.hours_per_semester / 1.5)
+    
+    # Build weekly slot scores based on preferences
+    weekly_slot_scores = []
+    for day in DAYS:
+        for slot in TIME_SLOTS:
+            score = get_preference_score(preference_matrix, assignment.teacher_id, day, slot) * 10
+            score -= (slot - 1) * 0.1
+            weekly_slot_scores.append((day, slot, score))
+    
+    weekly_slot_scores.sort(key=lambda x: x[2], reverse=True)
+    
+    # Calculate week interval
+    slots_per_week = slots_needed / WEEKS_PER_SEMESTER
+    week_interval = 1
+    if slots_per_week < 1:
+        week_interval = math.ceil(1 / slots_per_week)
+    
+    # Calculate distribution limits
+    max_slots_per_week = math.ceil(slots_needed / WEEKS_PER_SEMESTER)
+    # Ensure at least 1 slot per week allowed if weeks could be skipped due to interval
+    if max_slots_per_week < 1: max_slots_per_week = 1
     
+    return {
+        'assignment': assignment,
+        'teacher': state.teacher(assignment.teacher_id),
+        'group': state.group(assignment.group_id),
+        'a': state.assignment(assignment.id),
+        'slots_needed': slots_needed,
+        'eligible_rooms': get_eligible_rooms(state.rooms, assignment.subject.type, group_size),
+        'weekly_slot_scores': weekly_slot_scores,
+        'week_interval': week_interval,
+        'max_slots_per_week': max_slots_per_week
+    }
+
+
+def place_assignments(state, assignments, group_size, preference_matrix, weights,
+                      resolved_conflicts=None, on_assignment_done=None, template=False, profiler=None):
+    """Greedily place assignments of one group into the shared state, returns PlannedEntry list
+
+    With template=True recurring weekly / bi-weekly blocks of all assignments are
+    placed first on the 35-cell week grid; per-week search only handles what is left.
+    profiler (SolverProfile) receives counters of the search.
+    """
     if resolved_conflicts is None:
         resolved_conflicts = {}
-    
-    # Fetch data
-    assignments = TeacherSubject.query.filter_by(group_id=group_id).all()
-    rooms = Room.query.all()
-    preferences = Preference.query.all()
-    group = StudentGroup.query.get(group_id)
-    
-    if not group:
-        return {'error': 'Group not found'}
-    
-    group_size = group.size if group.size > 0 else 1
-    
-    # Delete existing draft batch for this group and semester if exists
-    if existing_batch_id:
-        old_batch = ScheduleBatch.query.get(existing_batch_id)
-        if old_batch:
-            db.session.delete(old_batch)
-            db.session.commit()
-    else:
-        # Delete any existing draft for this group/semester
-        old_drafts = ScheduleBatch.query.filter_by(
-            group_id=group_id, 
-            semester=semester, 
-            status='DRAFT'
-        ).all()
-        for old in old_drafts:
-            db.session.delete(old)
-        db.session.commit()
-    
-    # Create new batch in DRAFT status
-    batch = ScheduleBatch(
-        semester=semester,
-        group_id=group_id,
-        status='DRAFT'
-    )
-    db.session.add(batch)
-    db.session.flush()  # Get the ID
-    
-    # Get existing PUBLISHED entries for occupancy calculation
-    published_batches = ScheduleBatch.query.filter_by(semester=semester, status='PUBLISHED').all()
-    published_entries = []
-    for pb in published_batches:
-        published_entries.extend(pb.entries)
-    
-    # Also consider other DRAFT batches for global optimization
-    other_draft_batches = ScheduleBatch.query.filter(
-        ScheduleBatch.semester == semester,
-        ScheduleBatch.status == 'DRAFT',
-        ScheduleBatch.group_id != group_id
-    ).all()
-    draft_entries = []
-    for db_batch in other_draft_batches:
-        draft_entries.extend(db_batch.entries)
-    
-    all_existing = published_entries + draft_entries
+    score_cell, find_room = solver_steps(profiler)
     
     schedule = []
     conflicts = []
     
-    # Occupancy maps
-    teacher_occupancy = {}
-    group_occupancy = {}
-    room_occupancy = {}
-    
-    # Build occupancy from existing entries
-    for entry in all_existing:
-        key = f"{entry.week_number}-{entry.day_of_week}-{entry.time_slot}"
-        
-        if entry.room_id not in room_occupancy:
-            room_occupancy[entry.room_id] = set()
-        room_occupancy[entry.room_id].add(key)
-        
-        if entry.teacher_subject.teacher_id not in teacher_occupancy:
-            teacher_occupancy[entry.teacher_subject.teacher_id] = set()
-        teacher_occupancy[entry.teacher_subject.teacher_id].add(key)
-        
-        if entry.group_id not in group_occupancy:
-            group_occupancy[entry.group_id] = set()
-        group_occupancy[entry.group_id].add(key)
-    
-    def is_slot_occupied(teacher_id, g_id, week, day, slot):
-        key = f"{week}-{day}-{slot}"
-        if teacher_id in teacher_occupancy and key in teacher_occupancy[teacher_id]:
-            return True
-        if g_id in group_occupancy and key in group_occupancy[g_id]:
-            return True
-        return False
-    
-    def mark_slot_occupied(teacher_id, g_id, room_id, week, day, slot):
-        key = f"{week}-{day}-{slot}"
-        if teacher_id not in teacher_occupancy:
-            teacher_occupancy[teacher_id] = set()
-        if g_id not in group_occupancy:
-            group_occupancy[g_id] = set()
-        if room_id not in room_occupancy:
-            room_occupancy[room_id] = set()
-        teacher_occupancy[teacher_id].add(key)
-        group_occupancy[g_id].add(key)
-        room_occupancy[room_id].add(key)
-    
-    def get_occupied_rooms_at_slot(week, day, slot):
-        key = f"{week}-{day}-{slot}"
-        occupied = set()
-        for room_id, keys in room_occupancy.items():
-            if key in keys:
-                occupied.add(room_id)
-        return occupied
-    
     # Sort assignments by preference priority (higher first)
     def get_max_pref(assignment):
-        max_pref = 0
-        for p in preferences:
-            if p.teacher_id == assignment.teacher_id:
-                max_pref = max(max_pref, p.priority)
-        return max_pref
+        return get_max_preference(preference_matrix, assignment.teacher_id)
     
     sorted_assignments = sorted(assignments, key=get_max_pref, reverse=True)
     
-    # Process each assignment
-    for assignment in sorted_assignments:
-        slots_needed = math.ceil(assignment.subject.hours_per_semester / 1.5)
-        slots_scheduled = 0
-        
-        # Apply resolved conflicts first
+    def apply_resolved(plan):
+        """Mark manually resolved slots of an assignment, returns their count"""
+        assignment = plan['assignment']
         resolved = resolved_conflicts.get(assignment.id, [])
-        if resolved and isinstance(resolved, list):
-            for sl in resolved:
-                entry = ScheduleEntry(
-                    batch_id=batch.id,
-                    semester=semester,
-                    week_number=sl.get('week'),
-                    day_of_week=sl.get('day'),
-                    time_slot=sl.get('slot') or sl.get('hour'),
-                    room_id=sl.get('roomId'),
-                    teacher_subject_id=assignment.id,
-                    subject_id=assignment.subject_id,
-                    group_id=assignment.group_id
+        if not (resolved and isinstance(resolved, list)):
+            return 0
+        for sl in resolved:
+            schedule.append(PlannedEntry(assignment, sl.get('roomId'), sl.get('week'), sl.get('day'),
+                                         sl.get('slot') or sl.get('hour')))
+            state.mark_slot_occupied(plan['teacher'], plan['group'], state.rooms.position(sl.get('roomId')),
+                                     sl.get('week'), sl.get('day'), sl.get('slot') or sl.get('hour'), plan['a'])
+        return len(resolved)
+    
+    plans = [assignment_plan(state, assignment, group_size, preference_matrix) for assignment in sorted_assignments]
+    
+    # Template mode: recurring blocks of all assignments first, so per-week search
+    # fills the leftovers around a fixed week structure
+    scheduled = {}
+    if template:
+        for plan in plans:
+            scheduled[plan['a']] = apply_resolved(plan)
+        for plan in plans:
+            if scheduled[plan['a']] < plan['slots_needed']:
+                blocks, patterns = template_patterns(plan['slots_needed'] - scheduled[plan['a']],
+                                                     plan['week_interval'])
+                placed = place_template_blocks(
+                    state, plan['assignment'], plan['weekly_slot_scores'], plan['eligible_rooms'], weights,
+                    blocks, patterns, plan['max_slots_per_week'], profiler
                 )
-                schedule.append(entry)
-                mark_slot_occupied(assignment.teacher_id, assignment.group_id, sl.get('roomId'),
-                                 sl.get('week'), sl.get('day'), sl.get('slot') or sl.get('hour'))
-                slots_scheduled += 1
-        
-        # Build weekly slot scores based on preferences
-        weekly_slot_scores = []
-        for day in DAYS:
-            for slot in TIME_SLOTS:
-                score = get_preference_score(preferences, assignment.teacher_id, day, slot) * 10
-                score -= (slot - 1) * 0.1
-                weekly_slot_scores.append({'day': day, 'slot': slot, 'score': score})
-        
-        weekly_slot_scores.sort(key=lambda x: x['score'], reverse=True)
+                schedule.extend(placed)
+                scheduled[plan['a']] += len(placed)
+    
+    # Process each assignment
+    for plan in plans:
+        assignment = plan['assignment']
+        teacher, group, a = plan['teacher'], plan['group'], plan['a']
+        slots_needed = plan['slots_needed']
+        eligible_rooms = plan['eligible_rooms']
+        weekly_slot_scores = plan['weekly_slot_scores']
+        week_interval = plan['week_interval']
+        max_slots_per_week = plan['max_slots_per_week']
         
-        # Calculate week interval
-        slots_per_week = slots_needed / WEEKS_PER_SEMESTER
-        week_interval = 1
-        if slots_per_week < 1:
-            week_interval = math.ceil(1 / slots_per_week)
+        # Apply resolved conflicts first
+        slots_scheduled = scheduled[a] if template else apply_resolved(plan)
         
         slot_index = 0
         week_offset = 0
         
-        # Calculate distribution limits
-        max_slots_per_week = math.ceil(slots_needed / WEEKS_PER_SEMESTER)
-        # Ensure at least 1 slot per week allowed if weeks could be skipped due to interval
-        if max_slots_per_week < 1: max_slots_per_week = 1
-        
-        # Strict daily limit for THIS SUBJECT (max 2 blocks of same subject per day)
-        MAX_DAILY_SLOTS_PER_SUBJECT = 2
-        
-        # Daily limit for ENTIRE GROUP (max 5 blocks total per day) - can be relaxed if needed
-        MAX_DAILY_SLOTS_FOR_GROUP = 5
-        
         # Track if we need to relax group daily limit (fallback mode)
         relax_group_limit = False
         
@@ -299,9 +354,6 @@ def generate_schedule(group_id, semester=None, resolved_conflicts=None, existing
             best_candidate = None
             best_score = -float('inf')
             
-            # Get current assigned entries for this subject to check limits
-            current_assignment_entries = [e for e in schedule if e.teacher_subject_id == assignment.id]
-            
             # Search for ONE best slot across all eligible weeks
             weeks_to_check = range(1 + week_offset, WEEKS_PER_SEMESTER + 1, week_interval)
             
@@ -309,117 +361,56 @@ def generate_schedule(group_id, semester=None, resolved_conflicts=None, existing
                 if slots_scheduled >= slots_needed: break
                 
                 # Check weekly limit for this subject
-                slots_this_week = sum(1 for e in current_assignment_entries if e.week_number == week)
+                slots_this_week = state.week_load(a, week)
                 if slots_this_week >= max_slots_per_week:
                     continue
                 
                 # Check candidate slots (from preferences list)
-                for slot_info in weekly_slot_scores:
-                    day = slot_info['day']
-                    slot = slot_info['slot']
-                    
+                for day, slot, base_pref in weekly_slot_scores:
                     # Check daily limit for this subject (max 2 blocks of same subject)
-                    slots_this_day_subject = sum(1 for e in current_assignment_entries if e.week_number == week and e.day_of_week == day)
+                    slots_this_day_subject = state.day_load(a, week, day)
                     if slots_this_day_subject >= MAX_DAILY_SLOTS_PER_SUBJECT:
                         continue
                     
                     # Check daily limit for entire group (max 5 blocks total)
                     # Only enforce if not in fallback mode
                     if not relax_group_limit:
-                        group_slots_this_day = sum(1 for e in schedule if e.group_id == assignment.group_id and e.week_number == week and e.day_of_week == day)
+                        group_slots_this_day = state.group_load(group, week, day)
                         if group_slots_this_day >= MAX_DAILY_SLOTS_FOR_GROUP:
                             continue
                     
-                    base_pref = slot_info['score']
-                    
-                    if is_slot_occupied(assignment.teacher_id, assignment.group_id, week, day, slot):
+                    if state.is_slot_occupied(teacher, group, week, day, slot):
                         continue
                     
-                    occupied_rooms = get_occupied_rooms_at_slot(week, day, slot)
-                    room = find_suitable_room(rooms, assignment.subject.type, group_size, occupied_rooms)
-                    if not room:
+                    room = find_room(state.rooms, eligible_rooms, week, day, slot)
+                    if room is None:
                         continue
                     
-                    # Calculate Dynamic Score based on Weights
-                    w_pref = weights.get('preferences', 2)
-                    w_t = weights.get('teacher_gaps', 2)
-                    w_s = weights.get('student_gaps', 2)
-                    
-                    score = base_pref * w_pref * 2
-                    
-                    # === LOAD BALANCING: Prefer days with fewer classes ===
-                    # Count ALL classes for this group on this day (across all subjects)
-                    group_day_load = sum(1 for e in schedule if e.group_id == assignment.group_id and e.week_number == week and e.day_of_week == day)
-                    # Heavy penalty for adding to already busy days - encourages spreading across all weekdays
-                    score -= group_day_load * 50
-                    
-                    # === MORNING PREFERENCE: Prefer earlier time slots ===
-                    # Slot 1 (8:00) = +60 bonus, Slot 7 (18:00) = 0 bonus
-                    # This makes algorithm prefer morning classes over evening ones
-                    morning_bonus = (8 - slot) * 10
-                    score += morning_bonus
-                    
-                    # Teacher Gaps Analysis
-                    t_occupancy = teacher_occupancy.get(assignment.teacher_id, set())
-                    t_has_classes_today = False
-                    for k in t_occupancy:
-                        if k.startswith(f"{week}-{day}-"):
-                            t_has_classes_today = True
-                            break
-                    
-                    if t_has_classes_today:
-                        is_adj = f"{week}-{day}-{slot-1}" in t_occupancy or f"{week}-{day}-{slot+1}" in t_occupancy
-                        if is_adj: 
-                            score += 40 * w_t # Bonus for compactness
-                        else: 
-                            score -= 30 * w_t # Penalty for gap
-                            
-                    # Student Gaps Analysis
-                    s_occupancy = group_occupancy.get(assignment.group_id, set())
-                    s_has_classes_today = False
-                    for k in s_occupancy:
-                        if k.startswith(f"{week}-{day}-"):
-                            s_has_classes_today = True
-                            break
-                            
-                    if s_has_classes_today:
-                        is_adj = f"{week}-{day}-{slot-1}" in s_occupancy or f"{week}-{day}-{slot+1}" in s_occupancy
-                        if is_adj:
-                            score += 40 * w_s
-                        else:
-                            score -= 30 * w_s
+                    score = score_cell(state, teacher, group, base_pref, weights, week, day, slot)
                     
                     if score > best_score:
                         best_score = score
-                        best_candidate = {'week': week, 'day': day, 'slot': slot, 'room': room}
+                        best_candidate = (week, day, slot, room)
             
             if best_candidate:
-                c = best_candidate
-                entry = ScheduleEntry(
-                    batch_id=batch.id,
-                    semester=semester,
-                    week_number=c['week'],
-                    day_of_week=c['day'],
-                    time_slot=c['slot'],
-                    room_id=c['room'].id,
-                    teacher_subject_id=assignment.id,
-                    subject_id=assignment.subject_id,
-                    group_id=assignment.group_id
-                )
-                schedule.append(entry)
-                mark_slot_occupied(assignment.teacher_id, assignment.group_id, c['room'].id, 
-                                 c['week'], c['day'], c['slot'])
+                week, day, slot, room = best_candidate
+                schedule.append(PlannedEntry(assignment, state.rooms.rooms[room].id, week, day, slot))
+                state.mark_slot_occupied(teacher, group, room, week, day, slot, a)
                 slots_scheduled += 1
             else:
                 # No slot found with current constraints
                 # FALLBACK: If we haven't relaxed the group limit yet, try relaxing it
                 if not relax_group_limit:
                     relax_group_limit = True
+                    if profiler:
+                        profiler.count('groupLimitRelaxations')
                     # Don't increment week_offset, retry with relaxed limit
                     continue
                 else:
                     # Already in fallback mode - increase offset and try again
                     week_offset += 1
+                    if profiler:
+                        profiler.count('weekOffsetEscalations')
         
         # Create conflict if not all scheduled
         if slots_scheduled < slots_needed:
@@ -433,11 +424,11 @@ def generate_schedule(group_id, semester=None, resolved_conflicts=None, existing
                     for slot in TIME_SLOTS:
                         if len(suggested_slots) >= 8:
                             break
-                        if is_slot_occupied(assignment.teacher_id, assignment.group_id, week, day, slot):
+                        if state.is_slot_occupied(teacher, group, week, day, slot):
                             continue
-                        occupied_rooms = get_occupied_rooms_at_slot(week, day, slot)
-                        room = find_suitable_room(rooms, assignment.subject.type, group_size, occupied_rooms)
-                        if room:
+                        room = find_suitable_room(state.rooms, eligible_rooms, week, day, slot)
+                        if room is not None:
+                            room = state.rooms.rooms[room]
                             suggested_slots.append({
                                 'week': week,
                                 'day': day,
@@ -458,47 +449,373 @@ def generate_schedule(group_id, semester=None, resolved_conflicts=None, existing
                 'hoursNeeded': int(slots_needed * 1.5),
                 'suggestedSlots': suggested_slots
             })
+        
+        if on_assignment_done:
+            on_assignment_done()
+    
+    if profiler:
+        profiler.count('assignments', len(assignments))
+        profiler.count('entries', len(schedule))
+        profiler.count('conflicts', len(conflicts))
+    return schedule, conflicts
+
+
+def run_local_search(state, schedule, assignments, group_sizes, preference_matrix, weights,
+                     local_search, resolved_conflicts=None):
+    """Optional improvement phase over the greedy result; manually resolved slots stay fixed
+
+    group_sizes maps group id to its size, the schedule may cover several groups.
+    """
+    fixed = set()
+    for assignment_id, slots in (resolved_conflicts or {}).items():
+        if isinstance(slots, list):
+            for sl in slots:
+                fixed.add((assignment_id, sl.get('week'), sl.get('day'), sl.get('slot') or sl.get('hour')))
+    movable = [e for e in schedule
+               if (e.teacher_subject_id, e.week_number, e.day_of_week, e.time_slot) not in fixed]
+    
+    teacher_lookup = {a.id: a.teacher_id for a in assignments}
+    eligible_rooms = {a.id: get_eligible_rooms(state.rooms, a.subject.type, group_sizes[a.group_id])
+                      for a in assignments}
+    return improve_schedule(
+        state, movable, teacher_lookup, eligible_rooms, preference_matrix, weights,
+        local_search.get('iterations'), local_search.get('seconds'), local_search.get('seed', 0)
+    )
+
+
+def apply_batch_metrics(batch, schedule, preference_matrix, teacher_lookup):
+    """Store optimization metrics of the placed entries on the batch"""
+    batch.preference_score = calculate_preference_score(schedule, preference_matrix, teacher_lookup)
+    batch.teacher_gaps = calculate_gaps(schedule, 'teacher', teacher_lookup)
+    batch.student_gaps = calculate_gaps(schedule, 'student')
+
+
+def make_progress_counter(progress, total, offset=0):
+    """Wrap a progress(done, total) callback into a per-assignment tick"""
+    if progress is None:
+        return None
+    done = [offset]
     
-    # Save schedule to database
-    if schedule:
-        for entry in schedule:
-            db.session.add(entry)
+    def tick():
+        done[0] += 1
+        progress(done[0], total)
+    
+    return tick
+
+
+def make_offset_progress(progress, offset, total):
+    """Wrap a progress(done, total) callback of one batch into a run-wide one"""
+    if progress is None:
+        return None
+    return lambda done, batch_total: progress(offset + done, total)
+
+
+def generate_schedule(group_id, semester=None, resolved_conflicts=None, existing_batch_id=None, weights=None,
+                      progress=None, local_search=None, template=False, profile=False, profiler=None, commit=True):
+    """Generate schedule for a student group with weighted optimization
+
+    The old draft is replaced in one transaction, so an exception (e.g. a cancelled
+    job) rolled back by the caller keeps it; commit=False leaves the commit to the caller.
+    profile=True adds a 'profile' block with phase timings and search counters;
+    a caller's profiler (SolverProfile) collects them instead of a new one.
+    """
+    if semester is None:
+        semester = get_current_semester()
+    
+    if weights is None:
+        weights = dict(DEFAULT_WEIGHTS)
+    
+    started = time.perf_counter()
+    own_profiler = profiler is None
+    if own_profiler:
+        profiler = SolverProfile(detailed=profile)
+    
+    # Fetch data
+    with profiler.phase('load'):
+        assignments = TeacherSubject.query.filter_by(group_id=group_id).all()
+        rooms = Room.query.all()
+        preference_matrix = build_preference_matrix(Preference.query.all())
+        group = StudentGroup.query.get(group_id)
+        
+        if not group:
+            return {'error': 'Group not found'}
+        
+        group_size = group.size if group.size > 0 else 1
+    
+    with profiler.phase('persistence'):
+        # Delete existing draft batch for this group and semester if exists
+        if existing_batch_id:
+            old_batch = ScheduleBatch.query.get(existing_batch_id)
+            if old_batch:
+                db.session.delete(old_batch)
+        else:
+            # Delete any existing draft for this group/semester
+            old_drafts = ScheduleBatch.query.filter_by(
+                group_id=group_id, 
+                semester=semester, 
+                status='DRAFT'
+            ).all()
+            for old in old_drafts:
+                db.session.delete(old)
+        db.session.flush()
+        
+        # Create new batch in DRAFT status
+        batch = ScheduleBatch(
+            semester=semester,
+            group_id=group_id,
+            status='DRAFT'
+        )
+        db.session.add(batch)
+        db.session.flush()  # Get the ID
+    
+    # Occupancy from PUBLISHED batches and other groups' DRAFT batches
+    with profiler.phase('occupancy'):
+        state = ScheduleState(rooms)
+        load_existing_occupancy(state, semester, [group_id])
+    
+    with profiler.phase('placement'):
+        schedule, conflicts = place_assignments(
+            state, assignments, group_size, preference_matrix, weights, resolved_conflicts,
+            on_assignment_done=make_progress_counter(progress, len(assignments)),
+            template=template, profiler=profiler
+        )
+    
+    search_stats = None
+    if local_search:
+        with profiler.phase('localSearch'):
+            search_stats = run_local_search(
+                state, schedule, assignments, {group_id: group_size}, preference_matrix, weights,
+                local_search, resolved_conflicts
+            )
+    
+    # Save schedule to database in one INSERT
+    with profiler.phase('persistence'):
+        rows = entry_rows(schedule, batch.id, semester)
+        insert_entries(rows)
     
     # Calculate optimization metrics
-    batch.preference_score = calculate_preference_score(schedule, preferences)
-    batch.teacher_gaps = calculate_gaps(schedule, 'teacher')
-    batch.student_gaps = calculate_gaps(schedule, 'student')
+    with profiler.phase('metrics'):
+        teacher_lookup = {a.id: a.teacher_id for a in assignments}
+        apply_batch_metrics(batch, schedule, preference_matrix, teacher_lookup)
+    
+    with profiler.phase('persistence'):
+        # Serialize from the plan instead of reading entries back
+        lookup = build_entry_lookup(rooms, assignments, [group])
+        group_data = {'id': group.id, 'name': group.name}
+        
+        if commit:
+            db.session.commit()
+        serialized = serialize_entries(rows, lookup)
+    
+    stats = {
+        'totalEntries': len(rows),
+        'conflictsCount': len(conflicts),
+        'weeksCount': WEEKS_PER_SEMESTER,
+        'preferenceScore': batch.preference_score,
+        'teacherGaps': batch.teacher_gaps,
+        'studentGaps': batch.student_gaps
+    }
+    if search_stats:
+        stats['localSearch'] = search_stats
     
-    db.session.commit()
+    result = {
+        'batch': batch.to_dict(entries_count=len(rows)),
+        'schedule': serialized,
+        'conflicts': conflicts,
+        'group': group_data,
+        'semester': semester,
+        'stats': stats
+    }
+    if own_profiler:
+        profiler.log('generate_schedule', groupId=group_id, semester=semester)
+        record_solver_run('generate', time.perf_counter() - started, len(rows), len(conflicts))
+        if profile:
+            result['profile'] = profiler.to_dict()
+    return result
+
+
+def generate_all_schedules(semester=None, group_ids=None, weights=None, progress=None, local_search=None,
+                           template=False, profile=False):
+    """Generate DRAFT schedules for many groups in one pass over shared occupancy"""
+    if semester is None:
+        semester = get_current_semester()
     
-    # Fetch entries from database to get proper relationships
-    saved_entries = ScheduleEntry.query.filter_by(batch_id=batch.id).order_by(
-        ScheduleEntry.week_number, ScheduleEntry.day_of_week, ScheduleEntry.time_slot
-    ).all()
+    if weights is None:
+        weights = dict(DEFAULT_WEIGHTS)
+    
+    started = time.perf_counter()
+    profiler = SolverProfile(detailed=profile)
+    
+    # Fetch reference data once
+    with profiler.phase('load'):
+        query = StudentGroup.query
+        if group_ids:
+            query = query.filter(StudentGroup.id.in_(group_ids))
+        groups = query.order_by(StudentGroup.name).all()
+        target_ids = [g.id for g in groups]
+        
+        assignments = TeacherSubject.query.filter(TeacherSubject.group_id.in_(target_ids)).all()
+        assignments_by_group = {}
+        for assignment in assignments:
+            assignments_by_group.setdefault(assignment.group_id, []).append(assignment)
+        
+        # Without an explicit list only groups with assignments are planned
+        if not group_ids:
+            groups = [g for g in groups if g.id in assignments_by_group]
+            target_ids = [g.id for g in groups]
+        
+        if not groups:
+            return {'error': 'No groups found'}
+        
+        rooms = Room.query.all()
+        preference_matrix = build_preference_matrix(Preference.query.all())
+        teacher_lookup = {a.id: a.teacher_id for a in assignments}
+    
+    # Replace existing drafts of the planned groups
+    with profiler.phase('persistence'):
+        old_drafts = ScheduleBatch.query.filter(
+            ScheduleBatch.group_id.in_(target_ids),
+            ScheduleBatch.semester == semester,
+            ScheduleBatch.status == 'DRAFT'
+        ).all()
+        for old in old_drafts:
+            db.session.delete(old)
+        db.session.flush()
     
-    return {
-        'batch': batch.to_dict(),
-        'schedule': [e.to_dict() for e in saved_entries],
+    # Occupancy is built once and shared by every group
+    with profiler.phase('occupancy'):
+        state = ScheduleState(rooms)
+        load_existing_occupancy(state, semester, target_ids)
+    
+    batches = []
+    entries_counts = []
+    conflicts = []
+    total_entries = 0
+    placed = []
+    tick = make_progress_counter(progress, len(assignments))
+    
+    for group in groups:
+        with profiler.phase('load'):
+            group_size = group.size if group.size > 0 else 1
+        
+        with profiler.phase('persistence'):
+            batch = ScheduleBatch(
+                semester=semester,
+                group_id=group.id,
+                status='DRAFT'
+            )
+            db.session.add(batch)
+            db.session.flush()  # Get the ID
+        
+        with profiler.phase('placement'):
+            schedule, group_conflicts = place_assignments(
+                state, assignments_by_group.get(group.id, []), group_size,
+                preference_matrix, weights, on_assignment_done=tick, template=template, profiler=profiler
+            )
+        placed.append((batch, schedule))
+        conflicts.extend(group_conflicts)
+    
+    # One search over all groups, so moves of one group are weighed against the others
+    search_stats = None
+    if local_search:
+        with profiler.phase('localSearch'):
+            group_sizes = {g.id: g.size if g.size > 0 else 1 for g in groups}
+            search_stats = run_local_search(
+                state, [e for _, schedule in placed for e in schedule], assignments, group_sizes,
+                preference_matrix, weights, local_search
+            )
+    
+    for batch, schedule in placed:
+        with profiler.phase('persistence'):
+            insert_entries(entry_rows(schedule, batch.id, semester))
+        with profiler.phase('metrics'):
+            apply_batch_metrics(batch, schedule, preference_matrix, teacher_lookup)
+        
+        batches.append(batch)
+        entries_counts.append(len(schedule))
+        total_entries += len(schedule)
+    
+    # Persist all batches in one transaction
+    with profiler.phase('persistence'):
+        db.session.commit()
+    
+    result = {
+        'success': True,
+        'batches': [b.to_dict(entries_count=n) for b, n in zip(batches, entries_counts)],
         'conflicts': conflicts,
-        'group': {'id': group.id, 'name': group.name},
         'semester': semester,
         'stats': {
-            'totalEntries': len(saved_entries),
+            'groupsCount': len(batches),
+            'totalEntries': total_entries,
             'conflictsCount': len(conflicts),
-            'weeksCount': WEEKS_PER_SEMESTER,
-            'preferenceScore': batch.preference_score,
-            'teacherGaps': batch.teacher_gaps,
-            'studentGaps': batch.student_gaps
+            'weeksCount': WEEKS_PER_SEMESTER
         }
     }
+    if search_stats:
+        result['stats']['localSearch'] = search_stats
+    profiler.log('generate_all_schedules', semester=semester, groups=len(batches))
+    record_solver_run('generate_all', time.perf_counter() - started, total_entries, len(conflicts))
+    if profile:
+        result['profile'] = profiler.to_dict()
+    return result
 
 
-def reoptimize_drafts(batch_ids, semester=None, weights=None):
-    """Re-optimize selected draft schedules together"""
+def search_drafts(batches, semester, weights, local_search, profiler):
+    """One local search over the entries of several draft batches; rows and metrics are written again"""
+    with profiler.phase('load'):
+        group_ids = [b.group_id for b in batches]
+        rooms = Room.query.all()
+        group_sizes = {g.id: g.size if g.size > 0 else 1
+                       for g in StudentGroup.query.filter(StudentGroup.id.in_(group_ids))}
+        assignments = TeacherSubject.query.filter(TeacherSubject.group_id.in_(group_ids)).all()
+        assignments_by_id = {a.id: a for a in assignments}
+        teacher_lookup = {a.id: a.teacher_id for a in assignments}
+        preference_matrix = build_preference_matrix(Preference.query.all())
+        
+        schedules = {b.id: [] for b in batches}
+        for e in ScheduleEntry.query.filter(ScheduleEntry.batch_id.in_(list(schedules))):
+            schedules[e.batch_id].append(PlannedEntry(
+                assignments_by_id[e.teacher_subject_id], e.room_id, e.week_number, e.day_of_week, e.time_slot
+            ))
+    
+    with profiler.phase('occupancy'):
+        state = ScheduleState(rooms)
+        load_existing_occupancy(state, semester, group_ids)
+        for schedule in schedules.values():
+            for e in schedule:
+                state.mark_slot_occupied(
+                    state.teacher(teacher_lookup[e.teacher_subject_id]), state.group(e.group_id),
+                    state.rooms.position(e.room_id), e.week_number, e.day_of_week, e.time_slot,
+                    state.assignment(e.teacher_subject_id)
+                )
+    
+    with profiler.phase('localSearch'):
+        stats = run_local_search(
+            state, [e for schedule in schedules.values() for e in schedule], assignments, group_sizes,
+            preference_matrix, weights, local_search
+        )
+    
+    # Rows are replaced rather than updated, swapped cells would break the unique slot index
+    with profiler.phase('persistence'):
+        ScheduleEntry.query.filter(ScheduleEntry.batch_id.in_(list(schedules))).delete(synchronize_session=False)
+        for batch in batches:
+            insert_entries(entry_rows(schedules[batch.id], batch.id, semester))
+    with profiler.phase('metrics'):
+        for batch in batches:
+            apply_batch_metrics(batch, schedules[batch.id], preference_matrix, teacher_lookup)
+    return stats
+
+
+def reoptimize_drafts(batch_ids, semester=None, weights=None, progress=None, parallel=False, local_search=None,
+                      template=False, profile=False, chunks=None):
+    """Re-optimize selected draft schedules together; chunks only applies to parallel mode"""
     if semester is None:
         semester = get_current_semester()
     
+    started = time.perf_counter()
     results = []
+    conflicts_count = 0
+    profiler = SolverProfile(detailed=profile)
     
     # Get all batches to reoptimize
     batches = ScheduleBatch.query.filter(
@@ -509,22 +826,97 @@ def reoptimize_drafts(batch_ids, semester=None, weights=None):
     if not batches:
         return {'error': 'No draft batches found'}
     
-    # Reoptimize each batch in order
+    # Follow the caller's order, so repeated runs place groups the same way
+    position = {batch_id: i for i, batch_id in enumerate(batch_ids)}
+    batches.sort(key=lambda b: position[b.id])
+    
+    batches_by_semester = {}
     for batch in batches:
+        batches_by_semester.setdefault(batch.semester, []).append(batch)
+    
+    # The local search budget is for the whole run, each semester gets an equal share
+    semester_search = split_budget(local_search, len(batches_by_semester))
+    
+    # Parallel mode: chunks of groups are solved in separate processes and merged
+    if parallel:
+        from app.services.parallel import reoptimize_parallel
+        
+        totals = {'components': 0, 'chunks': 0, 'roomSwaps': 0, 'moved': 0, 'reconciled': 0}
+        for batch_semester, semester_batches in batches_by_semester.items():
+            result = reoptimize_parallel(semester_batches, batch_semester, weights or dict(DEFAULT_WEIGHTS), progress,
+                                         semester_search, template, profiler, chunks)
+            results.extend(result['batches'])
+            conflicts_count += result['conflictsCount']
+            for key in totals:
+                totals[key] += result[key]
+        
+        # roomSwaps / moved: entries whose room / cell was changed at merge, not chosen by the solver
+        result = {
+            'success': True,
+            'reoptimized': results,
+            'count': len(results),
+            'entriesCount': sum(b['entriesCount'] for b in results),
+            **totals,
+            'conflictsCount': conflicts_count
+        }
+        profiler.log('reoptimize_drafts', parallel=True, batches=len(results))
+        record_solver_run('reoptimize', time.perf_counter() - started,
+                          sum(b['entriesCount'] for b in results), conflicts_count)
+        if profile:
+            result['profile'] = profiler.to_dict()
+        return result
+    
+    # Assignment counts per group, so progress spans all batches
+    assignment_counts = dict(db.session.query(
+        TeacherSubject.group_id, func.count(TeacherSubject.id)
+    ).filter(
+        TeacherSubject.group_id.in_([b.group_id for b in batches])
+    ).group_by(TeacherSubject.group_id).all())
+    total_assignments = sum(assignment_counts.get(b.group_id, 0) for b in batches)
+    done_assignments = 0
+    
+    # Place each batch in order, then search all of them at once
+    placed = {}
+    for batch in batches:
+        batch_progress = make_offset_progress(progress, done_assignments, total_assignments)
+        done_assignments += assignment_counts.get(batch.group_id, 0)
+        
         result = generate_schedule(
             group_id=batch.group_id,
             semester=batch.semester,
             existing_batch_id=batch.id,
-            weights=weights
+            weights=weights,
+            progress=batch_progress,
+            template=template,
+            profiler=profiler,
+            commit=False
         )
         if 'error' not in result:
             results.append(result['batch'])
+            conflicts_count += len(result['conflicts'])
+            placed.setdefault(batch.semester, []).append(ScheduleBatch.query.get(result['batch']['id']))
     
-    return {
+    if semester_search:
+        for batch_semester, semester_batches in placed.items():
+            search_drafts(semester_batches, batch_semester, weights or dict(DEFAULT_WEIGHTS), semester_search,
+                          profiler)
+        results = [ScheduleBatch.query.get(b['id']).to_dict(entries_count=b['entriesCount']) for b in results]
+    
+    # All batches at once, a cancelled run leaves every old draft in place
+    db.session.commit()
+    
+    result = {
         'success': True,
         'reoptimized': results,
-        'count': len(results)
+        'count': len(results),
+        'conflictsCount': conflicts_count
     }
+    profiler.log('reoptimize_drafts', parallel=False, batches=len(results))
+    record_solver_run('reoptimize', time.perf_counter() - started,
+                      sum(b['entriesCount'] for b in results), conflicts_count)
+    if profile:
+        result['profile'] = profiler.to_dict()
+    return result
 
 
 def publish_batches(batch_ids):
@@ -544,6 +936,15 @@ def publish_batches(batch_ids):
         published.append(batch.to_dict())
     
     db.session.commit()
+    invalidate()
+    record_published(len(published))
+    
+    # Calendar clients of these groups and their teachers poll next, render their feeds now
+    groups = {batch.group_id: batch.group for batch in batches}
+    teachers = User.query.join(TeacherSubject, TeacherSubject.teacher_id == User.id).filter(
+        TeacherSubject.group_id.in_(groups)
+    ).distinct().all()
+    warm_feeds(groups.values(), teachers)
     
     return {
         'success': True,
@@ -0,0 +1,163 @@
+"""
+Read side of schedules
+One joined column query per request and a flat row -> dict serializer, no lazy loads
+"""
+
+from app import db
+from app.models.user import User
+from app.models.room import Room
+from app.models.subject import Subject
+from app.models.student_group import StudentGroup
+from app.models.teacher_subject import TeacherSubject
+from app.models.schedule_batch import ScheduleBatch
+from app.models.schedule_entry import ScheduleEntry
+from app.utils.pagination import encode_cursor
+
+
+def entries_query(semester, published_only=True):
+    """Flat rows of schedule entries with everything ScheduleEntry.to_dict needs"""
+    query = db.session.query(
+        ScheduleEntry.id,
+        ScheduleEntry.batch_id,
+        ScheduleEntry.semester,
+        ScheduleEntry.week_number,
+        ScheduleEntry.day_of_week,
+        ScheduleEntry.time_slot,
+        ScheduleBatch.status.label('batch_status'),
+        Room.name.label('room_name'),
+        Room.type.label('room_type'),
+        Subject.name.label('subject_name'),
+        Subject.type.label('subject_type'),
+        StudentGroup.id.label('group_id'),
+        StudentGroup.name.label('group_name'),
+        User.name.label('teacher_name')
+    ).join(
+        ScheduleBatch, ScheduleEntry.batch_id == ScheduleBatch.id
+    ).join(
+        Room, ScheduleEntry.room_id == Room.id
+    ).join(
+        Subject, ScheduleEntry.subject_id == Subject.id
+    ).join(
+        StudentGroup, ScheduleEntry.group_id == StudentGroup.id
+    ).join(
+        TeacherSubject, ScheduleEntry.teacher_subject_id == TeacherSubject.id
+    ).join(
+        User, TeacherSubject.teacher_id == User.id
+    ).filter(ScheduleEntry.semester == semester)
+
+    if published_only:
+        # Drive from the (semester, status) batch index, entries follow by batch_id
+        published_ids = db.session.query(ScheduleBatch.id).filter(
+            ScheduleBatch.semester == semester, ScheduleBatch.status == 'PUBLISHED'
+        )
+        query = query.filter(ScheduleBatch.status == 'PUBLISHED', ScheduleEntry.batch_id.in_(published_ids))
+    return query
+
+
+def group_entries_query(group_id, semester, published_only=True):
+    return entries_query(semester, published_only).filter(ScheduleEntry.group_id == group_id)
+
+
+def teacher_entries_query(teacher_id, semester, published_only=True):
+    # IN (teacher's assignments) lets the planner drive from the teacher_subject_id index
+    assignment_ids = db.session.query(TeacherSubject.id).filter(TeacherSubject.teacher_id == teacher_id)
+    return entries_query(semester, published_only).filter(ScheduleEntry.teacher_subject_id.in_(assignment_ids))
+
+
+# Unique sort key of entries, also used as the keyset pagination cursor
+ORDER_COLUMNS = (ScheduleEntry.week_number, ScheduleEntry.day_of_week, ScheduleEntry.time_slot, ScheduleEntry.id)
+CURSOR_TYPES = (int, int, int, str)
+
+
+def filter_cells(query, week_from=None, week_to=None, day=None):
+    """Restrict entries to a week range and / or a single day"""
+    if week_from is not None:
+        query = query.filter(ScheduleEntry.week_number >= week_from)
+    if week_to is not None:
+        query = query.filter(ScheduleEntry.week_number <= week_to)
+    if day is not None:
+        query = query.filter(ScheduleEntry.day_of_week == day)
+    return query
+
+
+def ordered(query):
+    return query.order_by(*ORDER_COLUMNS)
+
+
+def row_cursor(row):
+    return encode_cursor((row.week_number, row.day_of_week, row.time_slot, row.id))
+
+
+def serialize_row(row):
+    """Same output as ScheduleEntry.to_dict() for one flat row"""
+    return {
+        'id': row.id,
+        'batchId': row.batch_id,
+        'semester': row.semester,
+        'weekNumber': row.week_number,
+        'dayOfWeek': row.day_of_week,
+        'timeSlot': row.time_slot,
+        'isPublished': row.batch_status == 'PUBLISHED',
+        'room': {'name': row.room_name, 'type': row.room_type},
+        'subject': {'name': row.subject_name, 'type': row.subject_type},
+        'group': {'id': row.group_id, 'name': row.group_name},
+        'teacherSubject': {
+            'teacher': {'name': row.teacher_name}
+        }
+    }
+
+
+def serialize_compact(rows):
+    """Week-collapsed format: lookup tables plus recurring events with a week bitmask
+
+    Entries that differ only by week become one event; bit (week - 1) of
+    weekMask is set for every week it takes place.
+    """
+    tables = {'rooms': {}, 'subjects': {}, 'teachers': {}, 'groups': {}}
+
+    def ref(table, key, value):
+        index = tables[table].get(key)
+        if index is None:
+            index = tables[table][key] = (len(tables[table]), value)
+        return index[0]
+
+    events = {}
+    for row in rows:
+        key = (
+            row.batch_id,
+            row.day_of_week,
+            row.time_slot,
+            ref('rooms', (row.room_name, row.room_type), {'name': row.room_name, 'type': row.room_type}),
+            ref('subjects', (row.subject_name, row.subject_type), {'name': row.subject_name, 'type': row.subject_type}),
+            ref('teachers', row.teacher_name, {'name': row.teacher_name}),
+            ref('groups', row.group_id, {'id': row.group_id, 'name': row.group_name})
+        )
+        event = events.get(key)
+        if event is None:
+            event = events[key] = {
+                'batchId': row.batch_id,
+                'semester': row.semester,
+                'dayOfWeek': row.day_of_week,
+                'timeSlot': row.time_slot,
+                'room': key[3],
+                'subject': key[4],
+                'teacher': key[5],
+                'group': key[6],
+                'isPublished': row.batch_status == 'PUBLISHED',
+                'weekMask': 0
+            }
+        event['weekMask'] |= 1 << (row.week_number - 1)
+
+    data = {'format': 'compact'}
+    for table, values in tables.items():
+        data[table] = [value for _, value in sorted(values.values(), key=lambda item: item[0])]
+    data['events'] = sorted(
+        events.values(),
+        key=lambda e: (e['dayOfWeek'], e['timeSlot'], e['weekMask'] & -e['weekMask'], e['group'])
+    )
+    return data
+
+
+def stream_rows(query, chunk_size=1000):
+    """Iterate ordered rows in chunks of chunk_size without loading the whole result"""
+    return ordered(query).yield_per(chunk_size)
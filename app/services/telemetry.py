@@ -0,0 +1,173 @@
+"""
+In-process Prometheus metrics: request latency per blueprint and solver throughput
+Rendered in the text exposition format at /metrics; pool workers send their samples
+back with the job result (drain / merge)
+"""
+
+import threading
+import time
+
+from flask import g, request
+
+# Upper bounds (seconds) of histogram buckets
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SOLVER_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {} if labels else {(): 0}
+
+    def inc(self, n=1, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def merge(self, values):
+        for key, value in values:
+            key = tuple(key)
+            self.values[key] = self.values.get(key, 0) + value
+
+    def export(self):
+        return [[list(key), value] for key, value in self.values.items()]
+
+    def lines(self):
+        for key, value in sorted(self.values.items()):
+            yield '%s%s %s' % (self.name, _labels(self.label_names, key), _number(value))
+
+
+class Histogram:
+    """Cumulative buckets, sum and count per label set"""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [count per bucket (+Inf last), sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with _lock:
+            item = self.values.get(key)
+            if item is None:
+                item = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                i = len(self.buckets)
+            item[0][i] += 1
+            item[1] += value
+
+    def merge(self, values):
+        for key, (counts, total) in values:
+            item = self.values.setdefault(tuple(key), [[0] * (len(self.buckets) + 1), 0.0])
+            item[0] = [a + b for a, b in zip(item[0], counts)]
+            item[1] += total
+
+    def export(self):
+        return [[list(key), [list(counts), total]] for key, (counts, total) in self.values.items()]
+
+    def lines(self):
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(bound)
+                yield '%s_bucket%s %d' % (self.name, _labels(self.label_names, key, [('le', le)]), cumulative)
+            yield '%s_sum%s %s' % (self.name, _labels(self.label_names, key), _number(total))
+            yield '%s_count%s %d' % (self.name, _labels(self.label_names, key), cumulative)
+
+
+REQUESTS = Counter('sohz_http_requests_total', 'HTTP requests by blueprint, method and status',
+                   ('blueprint', 'method', 'status'))
+REQUEST_DURATION = Histogram('sohz_http_request_duration_seconds', 'HTTP request latency by blueprint',
+                             ('blueprint', 'method'))
+SOLVER_DURATION = Histogram('sohz_solver_duration_seconds', 'Solver run duration by operation',
+                            ('operation',), SOLVER_BUCKETS)
+ENTRIES_GENERATED = Counter('sohz_schedule_entries_generated_total', 'Schedule entries generated',
+                            ('operation',))
+CONFLICTS = Counter('sohz_schedule_conflicts_total', 'Unscheduled conflicts produced by the solver',
+                    ('operation',))
+BATCHES_PUBLISHED = Counter('sohz_schedule_batches_published_total', 'Schedule batches published')
+
+METRICS = (REQUESTS, REQUEST_DURATION, SOLVER_DURATION, ENTRIES_GENERATED, CONFLICTS, BATCHES_PUBLISHED)
+# Sent back from pool workers, which serve no requests
+SOLVER_METRICS = (SOLVER_DURATION, ENTRIES_GENERATED, CONFLICTS)
+
+
+def init_request_metrics(app):
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            blueprint = request.blueprint or 'none'
+            REQUEST_DURATION.observe(time.perf_counter() - started, blueprint=blueprint, method=request.method)
+            REQUESTS.inc(blueprint=blueprint, method=request.method, status=response.status_code)
+        return response
+
+
+def record_solver_run(operation, seconds, entries, conflicts):
+    SOLVER_DURATION.observe(seconds, operation=operation)
+    ENTRIES_GENERATED.inc(entries, operation=operation)
+    CONFLICTS.inc(conflicts, operation=operation)
+
+
+def record_published(count):
+    BATCHES_PUBLISHED.inc(count)
+
+
+def drain():
+    """Solver samples of this process as plain data, cleared afterwards"""
+    with _lock:
+        data = {metric.name: metric.export() for metric in SOLVER_METRICS}
+        for metric in SOLVER_METRICS:
+            metric.values.clear()
+    return data
+
+
+def merge(data):
+    """Add samples returned by drain() in another process"""
+    with _lock:
+        for metric in SOLVER_METRICS:
+            metric.merge(data.get(metric.name, ()))
+
+
+def render():
+    with _lock:
+        lines = []
+        for metric in METRICS:
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            lines.extend(metric.lines())
+    return '\n'.join(lines) + '\n'
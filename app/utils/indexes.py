@@ -0,0 +1,93 @@
+# Index maintenance and query plan checks for the hot schedule queries
+# db.create_all() only creates indexes together with new tables, ensure_indexes()
+# adds the ones declared on the models to an existing database.
+#
+# Usage: python -m app.utils.indexes  (exits with 1 if a hot query scans a large table
+# or does not use its index)
+
+import sys
+
+from sqlalchemy import inspect
+
+from app import db
+
+# Tables that grow with the number of groups; a full scan of them is a regression
+LARGE_TABLES = ('schedule_entries', 'schedule_batches', 'teacher_subjects')
+
+
+def ensure_indexes():
+    """Create indexes declared on the models that the database does not have yet"""
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+    return created
+
+
+def hot_queries(semester='WINTER'):
+    """Name -> (query, index it must use or None) for every read path that must stay index-backed"""
+    from app.models.schedule_batch import ScheduleBatch
+    from app.models.schedule_entry import ScheduleEntry
+    from app.models.student_group import StudentGroup
+    from app.models.teacher_subject import TeacherSubject
+    from app.services.schedule_reader import entries_query, group_entries_query, ordered, teacher_entries_query
+
+    return {
+        'group schedule': (ordered(group_entries_query('group-id', semester)), 'ix_schedule_entries_group_cell'),
+        'teacher schedule': (ordered(teacher_entries_query('teacher-id', semester)),
+                             'ix_schedule_entries_teacher_subject_cell'),
+        'published semester': (ordered(entries_query(semester)), 'ix_schedule_batches_semester_status_group'),
+        'entries by assignments': (ScheduleEntry.query.filter(
+            ScheduleEntry.teacher_subject_id.in_(['assignment-1', 'assignment-2']),
+            ScheduleEntry.semester == semester
+        ), 'ix_schedule_entries_teacher_subject_cell'),
+        'batch listing': (ScheduleBatch.query.filter_by(semester=semester).order_by(ScheduleBatch.created_at.desc()),
+                          'ix_schedule_batches_semester_created'),
+        'group drafts': (ScheduleBatch.query.filter_by(semester=semester, status='DRAFT', group_id='group-id'),
+                         'ix_schedule_batches_semester_status_group'),
+        'group assignments': (TeacherSubject.query.filter_by(group_id='group-id'), 'ix_teacher_subjects_group'),
+        'group sizes': (StudentGroup.query, 'ix_users_group'),
+    }
+
+
+def explain(query):
+    """SQLite EXPLAIN QUERY PLAN detail lines of a query"""
+    statement = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {statement}'))]
+
+
+def find_plan_regressions(semester='WINTER'):
+    """[(query name, problem)] for hot queries that scan a large table or skip their index"""
+    if db.engine.dialect.name != 'sqlite':
+        return []  # plan format below is SQLite specific
+    problems = []
+    for name, (query, index) in hot_queries(semester).items():
+        plan = explain(query)
+        for line in plan:
+            if any(line.startswith(f'SCAN {table}') for table in LARGE_TABLES):
+                problems.append((name, line))
+        if index and not any(f'INDEX {index} ' in line for line in plan):
+            problems.append((name, f'{index} not used: {"; ".join(plan)}'))
+    return problems
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        for name in ensure_indexes():
+            print(f'created index {name}')
+        problems = find_plan_regressions()
+        for name, problem in problems:
+            print(f'{name}: {problem}')
+        if not problems:
+            print('all hot queries use their indexes')
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,50 @@
+# Keyset pagination helpers for list endpoints
+# Opt-in with ?limit=N; the response then becomes {'items': [...], 'nextCursor': '...'}
+# and the next page is requested with ?after=<nextCursor>
+
+from sqlalchemy import tuple_
+
+MAX_PAGE_SIZE = 1000
+CURSOR_SEPARATOR = '|'
+
+
+def get_page_limit(args):
+    """Page size from ?limit=, None when the client did not ask for pagination"""
+    limit = args.get('limit', type=int)
+    if limit is None:
+        return None
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    return CURSOR_SEPARATOR.join(str(v) for v in values)
+
+
+def decode_cursor(cursor, types):
+    """Parse a cursor back into typed values, None if it is malformed"""
+    if not cursor:
+        return None
+    parts = cursor.split(CURSOR_SEPARATOR)
+    if len(parts) != len(types):
+        return None
+    try:
+        return [t(p) for t, p in zip(types, parts)]
+    except ValueError:
+        return None
+
+
+def keyset_page(query, columns, limit, after=None, descending=False):
+    """Apply keyset condition, ordering and limit; columns must form a unique key
+
+    Returns (rows, last row when another page exists, else None). One extra
+    row is fetched to know whether there is a next page.
+    """
+    if after is not None:
+        key = tuple_(*columns)
+        query = query.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+    query = query.order_by(*[c.desc() if descending else c for c in columns])
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, rows[-1]
@@ -0,0 +1,220 @@
+"""
+Solver benchmark on synthetic datasets (see seed.populate_synthetic)
+Times generate, generate-all, reoptimize and publish at several scale points and
+records wall time, peak RSS, query counts and quality metrics to a JSON baseline
+
+    python benchmark.py                                  # 10 / 50 / 200 groups -> benchmark.json
+    python benchmark.py --scales 10 50 --compare benchmark.json
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SCALES = [10, 50, 200]
+SEMESTER = 'WINTER'
+
+# A step is a regression when it is this much slower than the baseline (and above the noise floor)
+TIME_TOLERANCE = 0.25
+TIME_NOISE_FLOOR = 0.05  # seconds
+
+
+def peak_rss_kb():
+    """High-water mark of this process' resident memory, None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS, KB on Linux
+
+
+class QueryCounter:
+    """Count SQL statements executed on an engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def batch_quality(batches):
+    """Aggregate metrics of returned batch dicts"""
+    scores = [b['preferenceScore'] for b in batches if b.get('preferenceScore') is not None]
+    return {
+        'batches': len(batches),
+        'entries': sum(b.get('entriesCount') or 0 for b in batches),
+        'preferenceScore': round(sum(scores) / len(scores), 1) if scores else None,
+        'teacherGaps': sum(b.get('teacherGaps') or 0 for b in batches),
+        'studentGaps': sum(b.get('studentGaps') or 0 for b in batches)
+    }
+
+
+def run_scale(groups, options):
+    """Seed a fresh database and time every step; runs in its own process so peak RSS is per scale"""
+    from app import create_app, db
+    from app.models.student_group import StudentGroup
+    from app.models.schedule_batch import ScheduleBatch
+    from app.services import schedule_generator
+    from config import Config
+    from seed import populate_synthetic, reset_database
+
+    workdir = tempfile.mkdtemp(prefix='sohz-benchmark-')
+    config = type('BenchmarkConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'benchmark.db'),
+        'SCHEDULE_SOLVER_PROCESSES': options['processes']
+    })
+    app = create_app(config)
+    steps = {}
+
+    def measure(name, run, quality):
+        with QueryCounter(db.engine) as queries:
+            start = time.perf_counter()
+            result = run()
+            seconds = time.perf_counter() - start
+        if 'error' in result:
+            raise RuntimeError(f'{name}: {result["error"]}')
+        steps[name] = {
+            'seconds': round(seconds, 3),
+            'queries': queries.count,
+            'peakRssKb': peak_rss_kb(),
+            'quality': quality(result)
+        }
+        print(f'  {groups:>4} groups  {name:<12} {seconds:8.2f}s  {queries.count:>6} queries', flush=True)
+        return result
+
+    def draft_ids():
+        return [b.id for b in ScheduleBatch.query.filter_by(semester=SEMESTER, status='DRAFT').join(
+            StudentGroup, ScheduleBatch.group_id == StudentGroup.id).order_by(StudentGroup.name)]
+
+    try:
+        with app.app_context():
+            reset_database()
+            dataset = populate_synthetic(
+                groups=groups, teachers=options['teachers'], rooms=options['rooms'],
+                assignments_per_group=options['assignments_per_group'],
+                preference_density=options['preference_density'], seed=options['seed']
+            )
+            first_group = StudentGroup.query.order_by(StudentGroup.name).first().id
+            db.session.remove()
+
+            measure('generate', lambda: schedule_generator.generate_schedule(first_group, SEMESTER),
+                    lambda r: {**batch_quality([r['batch']]), 'conflicts': len(r['conflicts'])})
+            measure('generate-all', lambda: schedule_generator.generate_all_schedules(SEMESTER),
+                    lambda r: {**batch_quality(r['batches']), 'conflicts': len(r['conflicts'])})
+            ids = draft_ids()
+            measure('reoptimize',
+                    lambda: schedule_generator.reoptimize_drafts(ids, SEMESTER, parallel=options['parallel']),
+                    lambda r: {**batch_quality(r['reoptimized']), 'conflicts': r['conflictsCount']})
+            ids = draft_ids()
+            measure('publish', lambda: schedule_generator.publish_batches(ids),
+                    lambda r: {'batches': r['count']})
+            db.session.remove()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {'groups': groups, 'dataset': dataset, 'steps': steps}
+
+
+def compare(report, baseline):
+    """Regressions of report against baseline as readable lines"""
+    problems = []
+    previous = {scale['groups']: scale for scale in baseline.get('scales', [])}
+    for scale in report['scales']:
+        old_scale = previous.get(scale['groups'])
+        if old_scale is None:
+            continue
+        for name, step in scale['steps'].items():
+            old = old_scale['steps'].get(name)
+            if old is None:
+                continue
+            label = f'{scale["groups"]} groups / {name}'
+            if step['seconds'] > old['seconds'] * (1 + TIME_TOLERANCE) and \
+                    step['seconds'] - old['seconds'] > TIME_NOISE_FLOOR:
+                problems.append(f'{label}: {old["seconds"]}s -> {step["seconds"]}s')
+            if step['queries'] > old['queries']:
+                problems.append(f'{label}: {old["queries"]} -> {step["queries"]} queries')
+            conflicts, old_conflicts = step['quality'].get('conflicts'), old['quality'].get('conflicts')
+            if conflicts is not None and old_conflicts is not None and conflicts > old_conflicts:
+                problems.append(f'{label}: {old_conflicts} -> {conflicts} conflicts')
+    return problems
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the schedule solver on synthetic data')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help='numbers of groups')
+    parser.add_argument('--teachers', type=int, default=None)
+    parser.add_argument('--rooms', type=int, default=None)
+    parser.add_argument('--assignments-per-group', type=int, default=6)
+    parser.add_argument('--preference-density', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--parallel', action='store_true', help='reoptimize with independent groups in parallel')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='solver processes for --parallel')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='exit with 1 when slower than this baseline')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    options = {
+        'teachers': args.teachers,
+        'rooms': args.rooms,
+        'assignments_per_group': args.assignments_per_group,
+        'preference_density': args.preference_density,
+        'seed': args.seed,
+        'parallel': args.parallel,
+        'processes': args.processes
+    }
+
+    scales = []
+    context = multiprocessing.get_context('spawn')
+    for groups in args.scales:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            scales.append(executor.submit(run_scale, groups, options).result())
+
+    report = {
+        'createdAt': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': options,
+        'scales': scales
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            problems = compare(report, json.load(f))
+        for line in problems:
+            print('REGRESSION', line)
+        if problems:
+            sys.exit(1)
+        print('No regressions against', args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,3 +8,20 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'dev.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SCHEDULE_JOB_WORKERS = int(os.environ.get('SCHEDULE_JOB_WORKERS') or 2)
+    SCHEDULE_SOLVER_PROCESSES = int(os.environ.get('SCHEDULE_SOLVER_PROCESSES') or os.cpu_count() or 1)
+    # Chunks of a parallel reoptimize; fixed so results do not depend on the host's CPU count
+    SCHEDULE_PARALLEL_CHUNKS = int(os.environ.get('SCHEDULE_PARALLEL_CHUNKS') or 4)
+    SCHEDULE_CACHE_SIZE = int(os.environ.get('SCHEDULE_CACHE_SIZE') or 256)
+    # Total size of cached response bodies
+    SCHEDULE_CACHE_BYTES = int(os.environ.get('SCHEDULE_CACHE_BYTES') or 64 * 1024 * 1024)
+    # Count queries per request, log statements slower than SQL_SLOW_QUERY_MS
+    SQL_QUERY_STATS = os.environ.get('SQL_QUERY_STATS', '').lower() in ('1', 'true', 'yes')
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS') or 100)
+    # Required as a bearer token by /metrics when set
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # max-age for calendar clients; the server keeps rendered feeds until the next publish or edit
+    CALENDAR_FEED_TTL = int(os.environ.get('CALENDAR_FEED_TTL') or 300)
+    # Monday of week 1 (YYYY-MM-DD); defaults to the current academic year
+    SEMESTER_START_WINTER = os.environ.get('SEMESTER_START_WINTER')
+    SEMESTER_START_SUMMER = os.environ.get('SEMESTER_START_SUMMER')
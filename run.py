@@ -1,8 +1,10 @@
 from app import create_app, db
+from app.utils.indexes import ensure_indexes
 
 app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        ensure_indexes()
     app.run(debug=True, port=5000)
@@ -1,6 +1,9 @@
 """
 Seed script to populate database with sample data
 Port from prisma/seed.ts
+
+    python seed.py                                   # small sample dataset
+    python seed.py --synthetic --groups 200 --seed 1 # generated large-scale dataset
 """
 
 from app import create_app, db
@@ -10,32 +13,50 @@ from app.models.subject import Subject
 from app.models.student_group import StudentGroup
 from app.models.teacher_subject import TeacherSubject
 from app.models.preference import Preference
+from app.models.schedule_batch import ScheduleBatch
+from app.models.schedule_entry import ScheduleEntry
+from app.utils.indexes import ensure_indexes
+import argparse
+import os
+import random
 import uuid
 
+# Synthetic dataset: hours per semester drawn from this list (30h = 20 blocks)
+SYNTHETIC_HOURS = [15, 30, 30, 45, 60]
+SYNTHETIC_GROUP_SIZE = (10, 30)
+SYNTHETIC_LECTURE_CAPACITIES = [40, 60, 100, 150]
+SYNTHETIC_LAB_CAPACITIES = [30, 30, 35]  # every group fits every lab
+
 def generate_id():
     return str(uuid.uuid4())[:25]
 
+def reset_database():
+    """Create tables and indexes, then remove all data"""
+    # Create instance directory if it doesn't exist
+    instance_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+    os.makedirs(instance_path, exist_ok=True)
+    
+    # Create all database tables (and indexes added since the tables were created)
+    db.create_all()
+    ensure_indexes()
+    print("Database tables created.")
+    
+    # Clear existing data
+    ScheduleEntry.query.delete()
+    ScheduleBatch.query.delete()
+    TeacherSubject.query.delete()
+    Preference.query.delete()
+    User.query.delete()
+    Room.query.delete()
+    Subject.query.delete()
+    StudentGroup.query.delete()
+    db.session.commit()
+
 def seed_database():
     app = create_app()
     
     with app.app_context():
-        # Create instance directory if it doesn't exist
-        import os
-        instance_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
-        os.makedirs(instance_path, exist_ok=True)
-        
-        # Create all database tables
-        db.create_all()
-        print("Database tables created.")
-        
-        # Clear existing data
-        TeacherSubject.query.delete()
-        Preference.query.delete()
-        User.query.delete()
-        Room.query.delete()
-        Subject.query.delete()
-        StudentGroup.query.delete()
-        db.session.commit()
+        reset_database()
         
         print("Creating groups...")
         groups = []
@@ -162,5 +183,105 @@ def seed_database():
         print("| Pracownik         | jan.nowak@uczelnia.pl    | password123 |")
         print("| Student           | student1@uczelnia.pl     | password123 |")
 
+def populate_synthetic(groups=10, teachers=None, rooms=None, assignments_per_group=6,
+                       preference_density=0.3, seed=0):
+    """Add a generated dataset in the current app context, the same seed gives the same data
+
+    teachers and rooms default to numbers that keep the plan feasible at the
+    given scale. Returns the number of created rows per kind.
+    """
+    rng = random.Random(seed)
+    teachers = teachers or max(4, groups * assignments_per_group // 10)
+    rooms = rooms or max(6, groups // 2 + 4)
+    subjects_count = max(12, assignments_per_group * 2)
+    
+    def synthetic_id():
+        return '%025x' % rng.getrandbits(100)
+    
+    # One bcrypt hash shared by every account keeps large datasets fast
+    admin = User(id=synthetic_id(), email='admin@uczelnia.pl', name='Administrator Systemu', role='ADMIN')
+    admin.set_password('password123')
+    db.session.add(admin)
+    
+    group_rows = [StudentGroup(id=synthetic_id(), name=f'SYN-{i + 1:03d}') for i in range(groups)]
+    room_rows = []
+    for i in range(rooms):
+        if i % 2:
+            room_rows.append(Room(id=synthetic_id(), name=f'Lab S{i + 1}', type='LAB',
+                                  capacity=rng.choice(SYNTHETIC_LAB_CAPACITIES)))
+        else:
+            room_rows.append(Room(id=synthetic_id(), name=f'Sala S{i + 1}', type='LECTURE',
+                                  capacity=rng.choice(SYNTHETIC_LECTURE_CAPACITIES)))
+    subject_rows = [
+        Subject(id=synthetic_id(), name=f'Przedmiot {i + 1}', type='LAB' if i % 2 else 'LECTURE',
+                hours_per_semester=rng.choice(SYNTHETIC_HOURS))
+        for i in range(subjects_count)
+    ]
+    teacher_rows = [
+        User(id=synthetic_id(), email=f'prowadzacy{i + 1}@uczelnia.pl', name=f'Prowadzący {i + 1}',
+             role='TEACHER', password=admin.password)
+        for i in range(teachers)
+    ]
+    db.session.add_all(group_rows + room_rows + subject_rows + teacher_rows)
+    
+    students = 0
+    for group in group_rows:
+        for _ in range(rng.randint(*SYNTHETIC_GROUP_SIZE)):
+            students += 1
+            db.session.add(User(id=synthetic_id(), email=f'student{students}@uczelnia.pl', name=f'Student {students}',
+                                role='STUDENT', password=admin.password, group_id=group.id))
+    
+    assignments = 0
+    for group in group_rows:
+        for subject in rng.sample(subject_rows, min(assignments_per_group, subjects_count)):
+            db.session.add(TeacherSubject(id=synthetic_id(), teacher_id=rng.choice(teacher_rows).id,
+                                          subject_id=subject.id, group_id=group.id))
+            assignments += 1
+    
+    preferences = 0
+    for teacher in teacher_rows:
+        for day in range(5):
+            for slot in range(1, 8):
+                if rng.random() < preference_density:
+                    db.session.add(Preference(id=synthetic_id(), teacher_id=teacher.id, day_of_week=day,
+                                              time_slot=slot, priority=rng.randint(1, 3)))
+                    preferences += 1
+    
+    db.session.commit()
+    return {
+        'groups': groups,
+        'teachers': teachers,
+        'rooms': rooms,
+        'subjects': subjects_count,
+        'students': students,
+        'assignments': assignments,
+        'preferences': preferences
+    }
+
+def seed_synthetic(**params):
+    app = create_app()
+    
+    with app.app_context():
+        reset_database()
+        counts = populate_synthetic(**params)
+        print("Synthetic seed completed:", ', '.join(f'{k}={v}' for k, v in counts.items()))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Populate the database with sample or synthetic data')
+    parser.add_argument('--synthetic', action='store_true', help='generate a large-scale dataset')
+    parser.add_argument('--groups', type=int, default=10)
+    parser.add_argument('--teachers', type=int, default=None)
+    parser.add_argument('--rooms', type=int, default=None)
+    parser.add_argument('--assignments-per-group', type=int, default=6)
+    parser.add_argument('--preference-density', type=float, default=0.3, help='share of cells with a preference')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    seed_database()
+    args = parse_args()
+    if args.synthetic:
+        seed_synthetic(groups=args.groups, teachers=args.teachers, rooms=args.rooms,
+                       assignments_per_group=args.assignments_per_group,
+                       preference_density=args.preference_density, seed=args.seed)
+    else:
+        seed_database()